@@ -1,21 +1,58 @@
+import io
+
 from tree import Tree
+from emitter import Emitter
+from frame_layout import layout_frame, is_simple, ARG_REGISTERS
+from liveness import liveness, uses
+from int64 import wrap
 
-def arm_codegen(tree):
-  funcs = []
-  for func in tree.funcs:
-    funcs.append(asm_function(func))
-  text_preamble = """
+def arm_codegen(tree, out=None):
+  """writes the assembly for tree to out, function by function.  without an out, returns it as a string"""
+  if out is None:
+    buffer = io.StringIO()
+    arm_codegen(tree, buffer)
+    return buffer.getvalue()
+
+  global file_numbers
+  file_numbers = {}
+  out.write("""
 \t.section	__TEXT,__text,regular,pure_instructions
 \t.build_version macos, 14, 0\tsdk_version 14, 2
-"""
+""")
+  for func in tree.funcs:
+    out.write("\n")
+    asm_function(func).write_to(out)
 
-  symbols_postamble = """
+  out.write("""
 
 .subsections_via_symbols
-"""
-  return text_preamble + "\n".join(funcs) + symbols_postamble
+""")
 
 current_function = None
+file_numbers = None  # source filename -> .file number
+
+def emit(opcode, *operands, comment=None):
+  current_function.emitter.instr(opcode, *operands, comment=comment)
+
+def emit_label(name):
+  current_function.emitter.label(name)
+
+def emit_comment(text):
+  current_function.emitter.comment(text)
+
+def file_number(filename):
+  if filename not in file_numbers:
+    # line table: each source file gets its .file right before the first .loc that refers to it
+    file_numbers[filename] = len(file_numbers) + 1
+    current_function.emitter.directive(".file", f'{file_numbers[filename]} "{filename}"')
+  return file_numbers[filename]
+
+def emit_loc(node, suffix=""):
+  """.loc directive mapping the following instructions to node's source position, if the parser recorded one"""
+  if 'line' not in node.__dict__ or 'filename' not in current_function.func.__dict__:
+    return
+  number = file_number(current_function.func.filename)
+  current_function.emitter.directive(".loc", f"{number} {node.line} {node.col}{suffix}")
 
 def try_lookup(name):
   if name in current_function.variables or name in current_function.func.params:
@@ -24,161 +61,437 @@ def try_lookup(name):
 
 def lookup(name):
   assert name in current_function.func.params or name in current_function.variables, f"Unknown variable: {name}"
-  if name in current_function.func.params:
-    result = current_function.func.params.index(name)
-    return push_register("x" + str(result))
+  if param_register(name):
+    push_register(param_register(name))
   else:
-    result = current_function.variables.get(name, None)
-    if result is None:
-      raise Exception(f"Unknown variable: {name}")
-    return [f"\tldr x17, [x29, #{(-result * 8)}]  ; lookup {name}"] + push_register('x17')
+    emit("ldr", "x17", variable_slot(name), comment=f"lookup {name}")
+    push_register('x17')
+
+def param_register(name):
+  """the register a param lives in, None for locals and for params passed on the stack"""
+  if name in current_function.func.params and current_function.func.params.index(name) < ARG_REGISTERS:
+    return "x" + str(current_function.func.params.index(name))
+  return None
+
+def variable_slot(name):
+  """memory slot of a local or of a param passed on the stack"""
+  if name in current_function.func.params:
+    # the caller stored it in its outgoing area, just above our saved x29/x30
+    return f"[x29, #{16 + 8 * (current_function.func.params.index(name) - ARG_REGISTERS)}]"
+  return frame_slot(current_function.variables[name])
+
+def frame_slot(offset):
+  """address of the slot offset bytes below x29.  ldur only reaches 256 bytes down, further slots are addressed off sp"""
+  if offset <= 256:
+    return f"[x29, #{-offset}]"
+  # ldr/str take an unsigned offset scaled by 8, up to 32760
+  assert current_function.frame.size - offset <= 32760, f"frame slot {offset} is out of reach of sp"
+  return f"[sp, #{current_function.frame.size - offset}]"
 
-def remember_var(name):
-  assert name not in current_function.func.params, f"Variable {name} already exists as a parameter"
-  assert name not in current_function.variables, f"Variable {name} already exists in this scope"
-  current_function.variables[name] = current_function.stack_size
-  return current_function.stack_size
+def temp_slot(depth=None):
+  """slot of the temporary at depth, by default the topmost one"""
+  if depth is None:
+    depth = current_function.depth
+  return frame_slot(current_function.frame.temp_base + 8 * depth)
 
 def push_register(register):
-  current_function.stack_size += 2
-  return [
-    f"\tsub sp, sp, #16  ; push {register}",
-    f"\tstr {register}, [sp]"
-  ]
+  current_function.depth += 1
+  emit("str", register, temp_slot(), comment=f"push {register}")
 
 def push_immediate(value):
-  current_function.stack_size += 2
-  return [
-    f"\tsub sp, sp, #16  ; push immediate {value}",
-    f"\tmov x17, #{value}",
-    f"\tstr x17, [sp]"
-  ]
+  current_function.depth += 1
+  load_immediate("x17", value, comment=f"push immediate {value}")
+  emit("str", "x17", temp_slot())
+
+def load_immediate(register, value, comment=None):
+  """mov when value fits in 16 bits, otherwise movz (or movn, for mostly ones) and a movk per remaining 16-bit chunk"""
+  value = wrap(value)
+  if -65536 <= value < 65536:
+    emit("mov", register, f"#{value}", comment=comment)
+    return
+  chunks = [(value >> shift) & 0xffff for shift in (0, 16, 32, 48)]
+  fill = 0xffff if chunks.count(0xffff) > chunks.count(0) else 0
+  first = True
+  for i, chunk in enumerate(chunks):
+    if chunk == fill:
+      continue
+    shift = [f"lsl #{16 * i}"] if i else []
+    if first:
+      if fill:
+        emit("movn", register, f"#{hex(~chunk & 0xffff)}", *shift, comment=comment)
+      else:
+        emit("movz", register, f"#{hex(chunk)}", *shift, comment=comment)
+      first = False
+    else:
+      emit("movk", register, f"#{hex(chunk)}", *shift)
 
 def pop_to_register(register):
-  current_function.stack_size -= 2
-  return [
-    f"\tldr {register}, [sp]  ; pop to {register}",
-    f"\tadd sp, sp, #16"
-  ]
+  emit("ldr", register, temp_slot(), comment=f"pop to {register}")
+  current_function.depth -= 1
 
 def asm_function(func):
+  """returns an Emitter holding the whole function"""
   # TODO handle that the first argument of main is w0, not x0 by doing a stur [#-4] or something.  check o0 for reference.
   # push arguments to stack and remember them like normal variables
   epilogue_label = f".{func.name}_epilogue"
-  epilogue = f"""
-{epilogue_label}:
-\tmov\tsp, x29
-\tldp\tx29, x30, [sp]             ; 16-byte Folded Reload
-\tadd\tsp, sp, #16
-\tret
-"""
 
   global current_function
-  current_function = Tree(type='current_function', func=func, epilogue_label=epilogue_label, found_return=False, stack_size=0, variables={}, block_count=0)
-  preamble = f"""
-\t.globl	_{func.name}                           ; -- Begin function {func.name}
-\t.p2align	2
-_{func.name}:                                  ; @{func.name}
-\tsub\tsp, sp, #16
-\tstp\tx29, x30, [sp]             ; 16-byte Folded Spill
-\tmov\tx29, sp
-"""
-  assembled = []
+  live_after = liveness(func)
+  frame = layout_frame(func, live_after)
+  current_function = Tree(type='current_function', func=func, epilogue_label=epilogue_label, found_return=False, frame=frame, depth=0, variables=frame.variables, live_after=live_after, block_count=0, emitter=Emitter())
+  out = current_function.emitter
+
+  out.directive(".globl", f"_{func.name}", comment=f"-- Begin function {func.name}")
+  out.directive(".p2align", "2")
+  out.label(f"_{func.name}")
+  out.directive(".cfi_startproc")
+  # the prologue and epilogue belong to the def line, not to whatever statement comes before them in the text
+  emit_loc(func)
+  emit("sub", "sp", "sp", "#16")
+  emit("stp", "x29", "x30", "[sp]", comment="16-byte Folded Spill")
+  emit("mov", "x29", "sp")
+  out.directive(".cfi_def_cfa", "w29", "16")
+  out.directive(".cfi_offset", "w30", "-8")
+  out.directive(".cfi_offset", "w29", "-16")
+  if frame.size:
+    # add/sub immediates are 12 bits, optionally shifted left by 12
+    assert frame.size < 1 << 24, f"Frame of {func.name} is too big: {frame.size} bytes"
+    comment = f"{len(frame.variables)} locals, {len(frame.saves)} param spills, {frame.max_depth} temporaries, {frame.outgoing // 8} stack args"
+    if frame.size >> 12:
+      emit("sub", "sp", "sp", f"#{frame.size >> 12}", "lsl #12", comment=comment)
+      comment = None
+    if frame.size & 0xfff:
+      emit("sub", "sp", "sp", f"#{frame.size & 0xfff}", comment=comment)
+  emit_loc(func, " prologue_end")
+
   for stmt in func.stmts:
-    assembled.extend(asm_stmt(stmt))
-  
+    asm_stmt(stmt)
+    assert current_function.depth == 0, f"temporaries left over after {stmt.type}"
+
   assert current_function.found_return, f"Function {func.name} has no return statement"
 
-  current_function = None
+  emit_label(epilogue_label)
+  emit_loc(func, " epilogue_begin")
+  emit("mov", "sp", "x29")
+  emit("ldp", "x29", "x30", "[sp]", comment="16-byte Folded Reload")
+  emit("add", "sp", "sp", "#16")
+  emit("ret")
+  out.directive(".cfi_endproc")
 
-  return preamble + "\n".join(assembled) + epilogue
+  current_function = None
+  return out
 
 def asm_stmt(stmt):
   if stmt.type == 'assign':
-    return asm_assign(stmt)
+    emit_loc(stmt)
+    asm_assign(stmt)
   elif stmt.type == 'if':
-    return asm_if(stmt)
+    emit_loc(stmt)
+    asm_if(stmt)
   elif stmt.type == 'ifelse':
-    return asm_ifelse(stmt)
+    emit_loc(stmt)
+    asm_ifelse(stmt)
   elif stmt.type == 'while':
-    return asm_while(stmt)
+    asm_while(stmt)
   elif stmt.type == 'return':
     current_function.found_return = True
-    return asm_expr(stmt.expr) + pop_to_register("x0") + ["\tb " + current_function.epilogue_label]
+    emit_loc(stmt)
+    asm_expr(stmt.expr, live_after(stmt))
+    pop_to_register("x0")
+    emit("b", current_function.epilogue_label)
   else:
     raise Exception(f"Unknown stmt type: {stmt.type}")
 
-def asm_if(stmt):
-  condition = asm_expr(stmt.condition)
-  block, block_id = asm_block(stmt.block)
-  end_block_id = current_function.block_count
+def live_after(stmt):
+  """names still needed once stmt's expression or condition has been evaluated"""
+  return current_function.live_after[id(stmt)]
+
+def new_block_id():
+  block_id = current_function.block_count
   current_function.block_count += 1
-  return condition + ["\tcmp x0, #0", f"\tbeq {block_id}f"] + block + [f"{end_block_id}:"]
+  return block_id
+
+def asm_if(stmt):
+  asm_expr(stmt.condition, live_after(stmt))
+  pop_to_register("x17")
+  # label numbers only have to be unique, so the end label is numbered up front and branches can name it before it is emitted
+  end_block_id = new_block_id()
+  emit("cmp", "x17", "#0")
+  emit("beq", f"{end_block_id}f")
+  asm_block(stmt.block)
+  emit_label(end_block_id)
 
 def asm_ifelse(stmt):
-  condition = asm_expr(stmt.condition)
-  if_block, if_block_id = asm_block(stmt.if_block)
-  else_block, else_block_id = asm_block(stmt.else_block)
-  end_block_id = current_function.block_count
-  current_function.block_count += 1
-  return condition + ["\tcmp x0, #0", f"\tbeq {else_block_id}f"] + if_block + [f"\tb {end_block_id}f"] + else_block + [f"{end_block_id}:",]
+  asm_expr(stmt.condition, live_after(stmt))
+  pop_to_register("x17")
+  else_block_id = new_block_id()
+  end_block_id = new_block_id()
+  emit("cmp", "x17", "#0")
+  emit("beq", f"{else_block_id}f")
+  asm_block(stmt.if_block)
+  emit("b", f"{end_block_id}f")
+  asm_block(stmt.else_block, else_block_id)
+  emit_label(end_block_id)
 
 def asm_while(stmt):
-  condition = asm_expr(stmt.condition)
-  condition_block_id = current_function.block_count
-  current_function.block_count += 1
-  block, block_id = asm_block(stmt.block)
-  end_block_id = current_function.block_count
-  current_function.block_count += 1
-  return ['\t; while condition', f"{condition_block_id}:",] + condition + ["\tcmp x0, #0", f"\tbeq {end_block_id}f", '\t; while block'] + block + [f"\tb {condition_block_id}b", '\t; end while', f"{end_block_id}:"]
+  emit_comment("while condition")
+  condition_block_id = new_block_id()
+  end_block_id = new_block_id()
+  emit_label(condition_block_id)
+  # the .loc goes after the label so that every iteration's condition is attributed to the while line
+  emit_loc(stmt)
+  asm_expr(stmt.condition, live_after(stmt))
+  pop_to_register("x17")
+  emit("cmp", "x17", "#0")
+  emit("beq", f"{end_block_id}f")
+  emit_comment("while block")
+  asm_block(stmt.block)
+  emit("b", f"{condition_block_id}b")
+  emit_comment("end while")
+  emit_label(end_block_id)
 
-def asm_block(block):
-  block_id = current_function.block_count
-  current_function.block_count += 1
-  assembled = [f'{block_id}:']
+def asm_block(block, block_id=None):
+  if block_id is None:
+    block_id = new_block_id()
+  emit_label(block_id)
   for stmt in block:
-    assembled.extend(asm_stmt(stmt))
-  return assembled, block_id
+    asm_stmt(stmt)
+  return block_id
 
 def asm_assign(asgn):
-  result = asm_expr(asgn.expr)
-  if asgn.var in current_function.func.params:
-    reg_slot = current_function.func.params.index(asgn.var)
-    return [f'\t; write to param in reg'] + result + pop_to_register("x" + str(reg_slot))
-  elif asgn.var in current_function.variables:
-    stack_slot = current_function.variables[asgn.var]
-    return [f'\t; write to var in stack'] + result + pop_to_register("x17") + [f"\tstr x17, [x29, #{(-stack_slot * 8)}]"]
+  if param_register(asgn.var):
+    emit_comment('write to param in reg')
+    asm_expr(asgn.expr, live_after(asgn))
+    pop_to_register(param_register(asgn.var))
   else:
-    stack_slot = remember_var(asgn.var)
-  return [f'\t; init + alloc {asgn.var}'] + result + [f'\t; {asgn.var} at {(stack_slot)*-8}']
+    emit_comment(f'write to {asgn.var} at {variable_slot(asgn.var)}')
+    asm_expr(asgn.expr, live_after(asgn))
+    pop_to_register("x17")
+    emit("str", "x17", variable_slot(asgn.var))
 
-def asm_expr(expr) -> list:
+def asm_expr(expr, live=frozenset()):
+  """evaluates expr and pushes its value.  live: the names read after expr, their registers must survive any call in it"""
   if expr.type == 'int':
-    return push_immediate(expr.value)
+    push_immediate(expr.value)
   elif expr.type == 'variable':
-    return lookup(expr.name)
+    lookup(expr.name)
   elif expr.type == 'binop':
-    left = asm_expr(expr.left)
-    right = asm_expr(expr.right)
-    if expr.op == '+':
-      return left + right + pop_to_register("x0") + pop_to_register("x1") + ["\tadd x0, x0, x1"] + push_register("x0")
-    elif expr.op == '-':
-      return left + right + pop_to_register("x0") + pop_to_register("x1") + ["\tsub x0, x0, x1"] + push_register("x0")
-    elif expr.op == '>':
-      return left + right + pop_to_register("x1") + pop_to_register("x0") + ["\tcmp x0, x1", "\tmov x0, #0", "\tcset x0, gt"] + push_register("x0")
-    elif expr.op == '<':
-      return left + right + pop_to_register("x1") + pop_to_register("x0") + ["\tcmp x0, x1", "\tmov x0, #0", "\tcset x0, lt"] + push_register("x0")
-    else:
-      raise Exception(f"Unknown binop: {expr.op}")
+    asm_binop(expr, live)
   elif expr.type == 'call':
-    # {type=call, name, args}
-    asm = []
-    if len(expr.args) > 4:
-      raise Exception(f"can't handle more than 4 arguments, given: {len(expr.args)}")
-    for i, arg in enumerate(expr.args):
-      asm.extend(asm_expr(arg))
-      asm.extend(pop_to_register("x" + str(i)))
-    asm.append(f"\tbl _{expr.name}")
-    return asm + push_register("x0")
+    asm_call(expr, live)
+  else:
+    raise Exception(f"Unknown expr type: {expr.type}")
+
+# comparison operator -> condition code for cset
+CONDITIONS = {'==': 'eq', '!=': 'ne', '<': 'lt', '>': 'gt', '<=': 'le', '>=': 'ge'}
+# what an operator becomes when its operands trade places, for the ones that can
+SWAPPED = {'+': '+', '*': '*', '==': '==', '!=': '!=', '<': '>', '>': '<', '<=': '>=', '>=': '<='}
+
+def asm_binop(expr, live):
+  # x9/x10 hold the operands and x9 the result, x11-x13 are scratch.  x0-x7 may be holding params
+  left, op, right = expr.left, expr.op, expr.right
+  if left.type == 'int' and right.type != 'int' and op in SWAPPED:
+    left, op, right = right, SWAPPED[op], left
+  if right.type == 'int':
+    # constant operands are folded into the instructions instead of going through a temporary
+    asm_expr(left, live)
+    pop_to_register("x9")
+    binop_constant(op, wrap(right.value))
+  else:
+    asm_expr(left, live | uses(right))
+    asm_expr(right, live)
+    pop_to_register("x10")
+    pop_to_register("x9")
+    binop_registers(op)
+  push_register("x9")
+
+def binop_registers(op):
+  """x9 = x9 op x10"""
+  if op == '+':
+    emit("add", "x9", "x9", "x10")
+  elif op == '-':
+    emit("sub", "x9", "x9", "x10")
+  elif op == '*':
+    emit("mul", "x9", "x9", "x10")
+  elif op in ('//', '%'):
+    floor_divide(op)
+  elif op == '<<':
+    emit("lsl", "x9", "x9", "x10")
+  elif op == '>>':
+    emit("asr", "x9", "x9", "x10")
+  elif op in CONDITIONS:
+    emit("cmp", "x9", "x10")
+    emit("cset", "x9", CONDITIONS[op])
+  else:
+    raise Exception(f"Unknown binop: {op}")
+
+def binop_constant(op, c):
+  """x9 = x9 op c"""
+  if op in ('+', '-') and -4096 < c < 4096:
+    if op == '-':
+      c = -c
+    if c:
+      emit("add" if c > 0 else "sub", "x9", "x9", f"#{abs(c)}")
+  elif op in CONDITIONS and 0 <= c < 4096:
+    emit("cmp", "x9", f"#{c}")
+    emit("cset", "x9", CONDITIONS[op])
+  elif op in ('<<', '>>'):
+    if c & 63:
+      emit("lsl" if op == '<<' else "asr", "x9", "x9", f"#{c & 63}")
+  elif op == '*':
+    multiply_constant(c)
+  elif op in ('//', '%') and c > 0:
+    divide_constant(op, c)
+  else:
+    load_immediate("x10", c)
+    binop_registers(op)
+
+def multiply_constant(c):
+  """x9 *= c, with at most two shifts and adds when c is one or two powers of two apart, mul otherwise"""
+  m = abs(c)
+  low = (m & -m).bit_length() - 1  # lowest set bit
+  if m == 0:
+    emit("mov", "x9", "#0")
+    return
+  elif m & (m - 1) == 0:
+    pass
+  elif ((m >> low) - 1) & ((m >> low) - 2) == 0:
+    # 2^a + 2^low = (2^(a - low) + 1) << low
+    emit("add", "x9", "x9", "x9", f"lsl #{((m >> low) - 1).bit_length() - 1}")
+  elif (m >> low) & ((m >> low) + 1) == 0:
+    # 2^a - 2^low = (2^(a - low) - 1) << low
+    emit("lsl", "x10", "x9", f"#{(m >> low).bit_length()}")
+    emit("sub", "x9", "x10", "x9")
+  else:
+    load_immediate("x10", c)
+    emit("mul", "x9", "x9", "x10")
+    return
+  if low:
+    emit("lsl", "x9", "x9", f"#{low}")
+  if c < 0:
+    emit("neg", "x9", "x9")
+
+def divide_constant(op, d):
+  """x9 //= d or x9 %= d for a constant d > 0, rounding towards negative infinity"""
+  if d & (d - 1) == 0:
+    # two's complement makes these floor already
+    k = d.bit_length() - 1
+    if op == '//' and k:
+      emit("asr", "x9", "x9", f"#{k}")
+    elif op == '%':
+      if k:
+        emit("and", "x9", "x9", f"#{d - 1}")
+      else:
+        emit("mov", "x9", "#0")
+    return
+
+  # for negative x, x // d == ~(~x // d), and ~x isn't negative.  so flip negative dividends, divide unsigned and flip back.
+  # dividends below 2^63 let the magic number fit in 64 bits: m = ceil(2^(64 + s) / d), x // d == (x * m) >> (64 + s)
+  s = d.bit_length() - 1
+  magic = -(-(1 << (64 + s)) // d)
+  emit("asr", "x10", "x9", "#63", comment=f"{op} {d}")
+  emit("eor", "x11", "x9", "x10")
+  load_immediate("x12", magic)
+  emit("umulh", "x11", "x11", "x12")
+  emit("lsr", "x11", "x11", f"#{s}")
+  if op == '//':
+    emit("eor", "x9", "x11", "x10")
+  else:
+    emit("eor", "x11", "x11", "x10")
+    load_immediate("x12", d)
+    emit("msub", "x9", "x11", "x12", "x9")
+
+def floor_divide(op):
+  """x9 //= x10 or x9 %= x10.  sdiv truncates, so the quotient is one too big when the remainder's sign differs from the divisor's"""
+  emit("sdiv", "x11", "x9", "x10")
+  emit("msub", "x12", "x11", "x10", "x9")
+  emit("eor", "x13", "x12", "x10")
+  emit("lsr", "x13", "x13", "#63")
+  emit("cmp", "x12", "#0")
+  emit("cset", "x12", "ne")
+  emit("and", "x13", "x13", "x12")
+  if op == '//':
+    emit("sub", "x9", "x11", "x13")
   else:
-    raise Exception(f"Unknown expr type: {expr.type}")
\ No newline at end of file
+    emit("sub", "x11", "x11", "x13")
+    emit("msub", "x9", "x11", "x10", "x9")
+
+def asm_call(call, live):
+  """
+  aapcs64: the first eight arguments go in x0-x7, the rest in 8-byte slots at sp.
+  arguments that need code of their own are evaluated into temporaries first, then every argument is moved into place at once,
+  so evaluating one argument never clobbers another that is already in its register.
+  x0-x7 are caller-saved: params that are still live after the call are spilled around it.
+  """
+  args = call.args
+  base = current_function.depth
+  temps = {}  # arg index -> depth of the temporary holding its value
+  for i, arg in enumerate(args):
+    if not is_simple(arg):
+      read_later = set()
+      for j, other in enumerate(args):
+        if j > i or is_simple(other):
+          read_later |= uses(other)
+      asm_expr(arg, live | read_later)
+      temps[i] = current_function.depth
+
+  def load(register, i):
+    """puts the value of args[i] in register, for arguments that don't come from a param register"""
+    arg = args[i]
+    if i in temps:
+      emit("ldr", register, temp_slot(temps[i]))
+    elif arg.type == 'int':
+      load_immediate(register, arg.value)
+    else:
+      emit("ldr", register, variable_slot(arg.name), comment=f"lookup {arg.name}")
+
+  def source_register(i):
+    if args[i].type == 'variable':
+      return param_register(args[i].name)
+    return None
+
+  # stack arguments first, while every param register still holds its own value
+  for i in range(ARG_REGISTERS, len(args)):
+    register = source_register(i)
+    if register is None:
+      load("x17", i)
+      register = "x17"
+    emit("str", register, f"[sp, #{8 * (i - ARG_REGISTERS)}]", comment=f"stack argument {i}")
+
+  params = current_function.func.params
+  saved = [j for j in range(min(len(params), ARG_REGISTERS)) if params[j] in live]
+  assert all(j in current_function.frame.saves for j in saved), "frame layout and codegen disagree on what is live across a call"
+  for j in saved:
+    emit("str", f"x{j}", frame_slot(current_function.frame.saves[j]), comment=f"save {params[j]} across call")
+
+  register_args = range(min(len(args), ARG_REGISTERS))
+  parallel_move({f"x{i}": source_register(i) for i in register_args if source_register(i) not in (None, f"x{i}")})
+  for i in register_args:
+    if source_register(i) is None:
+      load(f"x{i}", i)
+  current_function.depth = base
+
+  emit("bl", f"_{call.name}")
+  push_register("x0")
+  for j in saved:
+    emit("ldr", f"x{j}", frame_slot(current_function.frame.saves[j]), comment=f"restore {params[j]}")
+
+def parallel_move(moves):
+  """
+  emits moves {destination: source} between registers as if they all happened at once.
+  a move is safe once no other pending move still reads its destination, cycles are broken through x16
+  """
+  moves = dict(moves)
+  while moves:
+    for destination, source in moves.items():
+      if destination not in moves.values():
+        emit("mov", destination, source)
+        del moves[destination]
+        break
+    else:
+      # only cycles left: park one value in x16 and let the move reading it take it from there
+      destination, source = next(iter(moves.items()))
+      emit("mov", "x16", destination)
+      for d, s in moves.items():
+        if s == destination:
+          moves[d] = "x16"
@@ -0,0 +1,105 @@
+from tree import Tree
+
+# reads back the assembly arm_codegen writes, for tools that look at the generated code (sim.py, cost_model.py)
+
+# condition codes, for cset and b.cond
+CONDITIONS = ('eq', 'ne', 'lt', 'gt', 'le', 'ge', 'hi', 'lo', 'hs', 'ls', 'mi', 'pl')
+
+def parse_asm_file(file):
+  with open(file) as f:
+    return parse_asm(f.read())
+
+def parse_asm(text):
+  """
+  returns the labels and instructions of the text, in order, skipping directives and comments:
+    Tree('label', name='_main', line=12)
+    Tree('instr', op='ldr', operands=['x17', '[x29, #-8]'], line=20)
+  """
+  items = []
+  for line_no, line in enumerate(text.split('\n'), start=1):
+    line = strip_comment(line).strip()
+    if not line:
+      continue
+    if line.endswith(':'):
+      items.append(Tree('label', name=line[:-1], line=line_no))
+    elif line.startswith('.'):
+      continue  # directive
+    else:
+      parts = line.split(None, 1)
+      op = parts[0]
+      operands = split_operands(parts[1]) if len(parts) > 1 else []
+      items.append(Tree('instr', op=op, operands=operands, line=line_no))
+  return items
+
+def strip_comment(line):
+  for marker in (';', '//'):
+    if marker in line:
+      line = line[:line.index(marker)]
+  return line
+
+def split_operands(text):
+  """split on the commas that aren't inside a [memory operand]"""
+  operands = []
+  depth = 0
+  current = ''
+  for c in text:
+    if c == '[':
+      depth += 1
+    elif c == ']':
+      depth -= 1
+    if c == ',' and depth == 0:
+      operands.append(current.strip())
+      current = ''
+    else:
+      current += c
+  if current.strip():
+    operands.append(current.strip())
+  return operands
+
+def parse_memory(operand):
+  """'[x29, #-8]' -> ('x29', -8)"""
+  assert operand.startswith('[') and operand.endswith(']'), f"Not a memory operand: {operand}"
+  parts = [p.strip() for p in operand[1:-1].split(',')]
+  offset = parse_immediate(parts[1]) if len(parts) > 1 else 0
+  return parts[0], offset
+
+def parse_immediate(operand):
+  assert operand.startswith('#'), f"Not an immediate: {operand}"
+  return int(operand[1:], 0)
+
+def opcode(op):
+  """beq and b.eq are both b.cond"""
+  if op.startswith('b') and op.removeprefix('b').removeprefix('.') in CONDITIONS:
+    return 'b.cond'
+  return op
+
+def branch_condition(op):
+  """'beq' or 'b.eq' -> 'eq'"""
+  return op.removeprefix('b').removeprefix('.')
+
+def label_positions(items):
+  """label name -> where it is defined, in order.  a label's position is the index of the instruction that follows it"""
+  positions = {}
+  index = 0
+  for item in items:
+    if item.type == 'label':
+      positions.setdefault(item.name, []).append(index)
+    else:
+      index += 1
+  return positions
+
+def resolve_label(positions, name, at):
+  """
+  position a branch at instruction index at goes to, None if name isn't defined in positions.
+  numeric local labels are resolved like the assembler does: 1f is the next 1 after the branch, 1b the last one at or before it
+  """
+  if name[:-1].isdigit() and name[-1] in 'fb':
+    definitions = positions.get(name[:-1], [])
+    if name[-1] == 'f':
+      candidates = [d for d in definitions if d > at]
+      return candidates[0] if candidates else None
+    candidates = [d for d in definitions if d <= at]
+    return candidates[-1] if candidates else None
+  if name in positions:
+    return positions[name][0]
+  return None
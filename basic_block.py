@@ -1,4 +1,5 @@
 from tree import Tree
+from cfg import CFG
 
 def basic_blockify(program): 
   funcs = []
@@ -7,24 +8,27 @@ def basic_blockify(program):
   return Tree('program', funcs=funcs)
 
 def add_block(stmts):
-  """return the block, index of the new block"""
-  global basic_blocks
-  basic_blocks.append(Tree('basic_block', stmts=stmts, after=[], id=len(basic_blocks)))
-  return basic_blocks[-1]
+  """return the id of the new block"""
+  global cfg
+  block = cfg.add_block()
+  for stmt in stmts:
+    cfg.append(block, stmt)
+  return block
 
 def add_stmt(stmt):
-  global basic_blocks
-  basic_blocks[-1].stmts.append(stmt)
+  global cfg
+  cfg.append(peek(), stmt)
 
 def peek():
-  global basic_blocks
-  return basic_blocks[-1]
+  global cfg
+  return len(cfg) - 1
 
 def basic_blockify_func(func):
-  global basic_blocks
-  basic_blocks = [Tree('basic_block', stmts=[], after=[], id=0)]  # entry block
+  global cfg
+  cfg = CFG()
+  add_block([])  # entry block
   basic_blockify_block(func.stmts)
-  return Tree('func', name=func.name, params=func.params, block=basic_blocks)
+  return Tree('func', name=func.name, params=func.params, block=cfg)
 
 def basic_blockify_block(block: "list of stmts"):
   for i, stmt in enumerate(block):
@@ -47,7 +51,7 @@ def basic_blockify_block(block: "list of stmts"):
     
     else:
       raise Exception(f"Unknown stmt type: {stmt.type}")
-  return basic_blocks[-1]
+  return peek()
 
 # post-condition: peek() is an empty basic block after the if
 def basic_blockify_if(stmt, prior):
@@ -60,15 +64,15 @@ def basic_blockify_if(stmt, prior):
   final_block = basic_blockify_block(stmt.block)
   end_block = add_block([])  # both the content of the if_block and the condition skipping the block meet in the end_block
 
-  prior.stmts.append(Tree('br', block=condition_block.id))
-  prior.after.append(condition_block.id)
+  cfg.append(prior, Tree('br', block=condition_block))
+  cfg.add_edge(prior, condition_block)
 
-  condition_block.stmts.append(Tree('cbr', condition=stmt.condition, yes=then_block.id, no=end_block.id))
-  condition_block.after.append(then_block.id)
-  condition_block.after.append(end_block.id)
+  cfg.append(condition_block, Tree('cbr', condition=stmt.condition, yes=then_block, no=end_block))
+  cfg.add_edge(condition_block, then_block)
+  cfg.add_edge(condition_block, end_block)
 
-  final_block.stmts.append(Tree('br', block=end_block.id))
-  final_block.after.append(end_block.id)
+  cfg.append(final_block, Tree('br', block=end_block))
+  cfg.add_edge(final_block, end_block)
 
   return end_block
 
@@ -86,17 +90,17 @@ def basic_blockify_ifelse(stmt, prior):
   else_final_block = basic_blockify_block(stmt.else_block)
   end_block = add_block([])  # both the content of the if_block and the condition skipping the block meet in the end_block
 
-  prior.after.append(condition_block.id)
+  cfg.add_edge(prior, condition_block)
 
-  condition_block.stmts.append(Tree('cbr', condition=stmt.condition, yes=then_block.id, no=else_block.id))
-  condition_block.after.append(then_block.id)
-  condition_block.after.append(else_block.id)
+  cfg.append(condition_block, Tree('cbr', condition=stmt.condition, yes=then_block, no=else_block))
+  cfg.add_edge(condition_block, then_block)
+  cfg.add_edge(condition_block, else_block)
 
-  then_final_block.stmts.append(Tree('br', block=end_block.id))
-  then_final_block.after.append(end_block.id)
+  cfg.append(then_final_block, Tree('br', block=end_block))
+  cfg.add_edge(then_final_block, end_block)
 
-  else_final_block.stmts.append(Tree('br', block=end_block.id))
-  else_final_block.after.append(end_block.id)
+  cfg.append(else_final_block, Tree('br', block=end_block))
+  cfg.add_edge(else_final_block, end_block)
 
   return end_block
 
@@ -109,14 +113,14 @@ def basic_blockify_while(stmt, prior):
   final_block = basic_blockify_block(stmt.block)
   end_block = add_block([])
 
-  prior.stmts.append(Tree('br', block=condition_block.id))
-  prior.after.append(condition_block.id)
+  cfg.append(prior, Tree('br', block=condition_block))
+  cfg.add_edge(prior, condition_block)
 
-  final_block.stmts.append(Tree('br', block=condition_block.id))
-  final_block.after.append(condition_block.id)
+  cfg.append(final_block, Tree('br', block=condition_block))
+  cfg.add_edge(final_block, condition_block)
 
-  condition_block.stmts.append(Tree('cbr', condition=stmt.condition, yes=then_block.id, no=end_block.id))
-  condition_block.after.append(then_block.id)
-  condition_block.after.append(end_block.id)
+  cfg.append(condition_block, Tree('cbr', condition=stmt.condition, yes=then_block, no=end_block))
+  cfg.add_edge(condition_block, then_block)
+  cfg.add_edge(condition_block, end_block)
 
-  return end_block
\ No newline at end of file
+  return end_block
@@ -0,0 +1,87 @@
+from array import array
+
+class CFG:
+  """
+  Control flow graph of one function.
+  Blocks are dense integer ids.  Each block's successors, predecessors and instructions are arrays of ints,
+  the instructions themselves live in one flat arena shared by the whole function.
+  Postorder and reverse postorder are computed when first asked for and cached until the graph changes.
+  """
+  def __init__(self):
+    self.instrs = []  # arena: instruction index -> stmt
+    self.block_instrs = []  # block id -> array of instruction indices
+    self.succs = []  # block id -> array of block ids
+    self.preds = []  # block id -> array of block ids
+    self.entry = 0
+    self.cached_postorder = None
+    self.cached_rpo = None
+
+  def __len__(self):
+    return len(self.block_instrs)
+
+  def __iter__(self):
+    return iter(range(len(self.block_instrs)))
+
+  def add_block(self):
+    self.block_instrs.append(array('i'))
+    self.succs.append(array('i'))
+    self.preds.append(array('i'))
+    self.invalidate()
+    return len(self.block_instrs) - 1
+
+  def append(self, block, stmt):
+    """add stmt to the end of block, returns its index in the arena"""
+    self.instrs.append(stmt)
+    self.block_instrs[block].append(len(self.instrs) - 1)
+    return len(self.instrs) - 1
+
+  def add_edge(self, src, dst):
+    self.succs[src].append(dst)
+    self.preds[dst].append(src)
+    self.invalidate()
+
+  def stmts(self, block):
+    instrs = self.instrs
+    for i in self.block_instrs[block]:
+      yield instrs[i]
+
+  def invalidate(self):
+    self.cached_postorder = None
+    self.cached_rpo = None
+
+  def postorder(self):
+    if self.cached_postorder is None:
+      order = array('i')
+      if self.block_instrs:
+        visited = bytearray(len(self.block_instrs))
+        visited[self.entry] = 1
+        stack = [(self.entry, 0)]
+        succs = self.succs
+        while stack:
+          block, next_edge = stack[-1]
+          if next_edge < len(succs[block]):
+            stack[-1] = (block, next_edge + 1)
+            s = succs[block][next_edge]
+            if not visited[s]:
+              visited[s] = 1
+              stack.append((s, 0))
+          else:
+            order.append(block)
+            stack.pop()
+      self.cached_postorder = order
+    return self.cached_postorder
+
+  def rpo(self):
+    """reverse postorder: every block comes before its successors, except along back edges"""
+    if self.cached_rpo is None:
+      self.cached_rpo = array('i', self.postorder())
+      self.cached_rpo.reverse()
+    return self.cached_rpo
+
+  def __repr__(self):
+    lines = []
+    for block in self:
+      lines.append(f"block {block} -> {list(self.succs[block])}  (preds {list(self.preds[block])})")
+      for stmt in self.stmts(block):
+        lines.append("  " + repr(stmt).replace("\n", "\n  "))
+    return "\n".join(lines)
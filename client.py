@@ -0,0 +1,44 @@
+"""
+Thin client for server.py.  Only imports the standard library, so it starts much faster than running the compiler.
+
+  python client.py [--socket /tmp/subpython.sock] <file.py> [-o <out.S>]
+"""
+
+import json
+import os
+import socket
+import sys
+
+def compile_remote(sock_path, file, output=None):
+  request = {'id': 0, 'file': os.path.abspath(file)}
+  if output:
+    request['output'] = os.path.abspath(output)
+
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    sock.connect(sock_path)
+    sock.sendall(json.dumps(request).encode() + b'\n')
+    with sock.makefile('rb') as f:
+      return json.loads(f.readline())
+
+def main():
+  args = sys.argv[1:]
+  sock_path = '/tmp/subpython.sock'
+  output = None
+  if args[:1] == ['--socket']:
+    sock_path, args = args[1], args[2:]
+  if len(args) == 3 and args[1] == '-o':
+    output = args[2]
+    args = args[:1]
+  if len(args) != 1:
+    print("Usage: python client.py [--socket <path>] <file.py> [-o <out.S>]", file=sys.stderr)
+    sys.exit(1)
+
+  response = compile_remote(sock_path, args[0], output)
+  if 'error' in response:
+    print(response['error'], file=sys.stderr)
+    sys.exit(1)
+  if 'asm' in response:
+    sys.stdout.write(response['asm'])
+
+if __name__ == '__main__':
+  main()
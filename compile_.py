@@ -1,14 +1,26 @@
-from parse import parse_file
+from parse import parse_file, parse_content
 from arm_codegen import arm_codegen
 from basic_block import basic_blockify
 from ssa import ssa
+from whole_program import whole_program
 
-def compile_(file):
+def compile_(file, out=None):
+  """returns the asm, or streams it into out if given"""
   tree = parse_file(file)
   print(tree)
-  asm = arm_codegen(tree)
+  asm = arm_codegen(tree, out)
   return asm
 
+def compile_content(filename, content):
+  """like compile_, for source already in memory and without the debug dumps"""
+  return arm_codegen(parse_content(filename, content))
+
+def compile_whole_program(*files):
+  """compile several files as one program, keeping only what main can reach"""
+  program = whole_program([parse_file(file) for file in files])
+  print(program)
+  return arm_codegen(program)
+
 def compile_v2(file):
   tree = parse_file(file)
   print('parsed', tree)
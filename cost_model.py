@@ -0,0 +1,244 @@
+"""
+Static cost model for the assembly arm_codegen emits: estimates cycles per basic block and per function, without running anything.
+
+  python cost_model.py output/07_return_while.S           # text report
+  python cost_model.py --json output/07_return_while.S    # the same as json, stable enough to diff between compiler versions
+  python cost_model.py --diff old.json new.json           # per function change between two json reports
+
+Each block is scheduled on an in-order core: an instruction issues once the previous one has issued and its source
+registers (or the stack slot it loads, after a store) are ready.  Blocks are weighted by LOOP_WEIGHT ** loop depth,
+with loops found from the back edges of the CFG.
+"""
+
+import json
+import re
+import sys
+
+from tree import Tree
+from asm_parse import parse_asm, opcode, label_positions, resolve_label
+
+class Cost:
+  def __init__(self, latency, throughput, memory=0):
+    self.latency = latency  # cycles until the result can be used
+    self.throughput = throughput  # cycles until the next instruction can issue
+    self.memory = memory  # 8-byte memory accesses
+
+# roughly an apple m1 / cortex-a76 class core
+ALU = Cost(1, 0.25)
+COSTS = {
+  'mov': ALU, 'add': ALU, 'sub': ALU, 'cmp': ALU, 'cset': ALU, 'neg': ALU,
+  'movz': ALU, 'movn': ALU, 'movk': ALU, 'lsl': ALU, 'lsr': ALU, 'asr': ALU, 'and': ALU, 'eor': ALU,
+  'mul': Cost(3, 1), 'msub': Cost(3, 1), 'umulh': Cost(3, 1), 'sdiv': Cost(10, 7),  # sdiv: 7 to 12, depending on the operands
+  'ldr': Cost(4, 0.5, 1), 'ldur': Cost(4, 0.5, 1), 'ldp': Cost(4, 0.5, 2),
+  'str': Cost(1, 0.5, 1), 'stur': Cost(1, 0.5, 1), 'stp': Cost(1, 0.5, 2),
+  'b': Cost(1, 1), 'b.cond': Cost(1, 1), 'bl': Cost(1, 1), 'ret': Cost(1, 1),
+}
+STORE_TO_LOAD = 5  # a load of a slot that was just stored waits for store forwarding
+LOOP_WEIGHT = 10
+
+REGISTER = re.compile(r'^(?:[xw]\d+|sp|xzr|wzr)$')
+
+def cost(op):
+  name = opcode(op)
+  if name not in COSTS:
+    raise Exception(f"No cost for opcode: {op}")
+  return COSTS[name]
+
+def register(operand):
+  return 'x' + operand[1:] if operand[0] == 'w' and operand[1:].isdigit() else operand
+
+def effects(instr):
+  """(registers read, registers written, slot loaded, slot stored)"""
+  op, operands = opcode(instr.op), instr.operands
+  registers = [register(o) for o in operands if REGISTER.match(o)]
+  memory = [o for o in operands if o.startswith('[')]
+  bases = [register(m[1:-1].split(',')[0].strip()) for m in memory]
+  if op in ('str', 'stur', 'stp'):
+    return registers + bases, [], None, memory[0]
+  elif op in ('ldr', 'ldur', 'ldp'):
+    return bases, registers, memory[0], None
+  elif op == 'cmp':
+    return registers, ['nzcv'], None, None
+  elif op == 'movk':
+    return registers, registers, None, None  # keeps the other chunks of its destination
+  elif op == 'cset':
+    return ['nzcv'], registers, None, None
+  elif op == 'b.cond':
+    return ['nzcv'], [], None, None
+  elif op == 'b':
+    return [], [], None, None
+  elif op == 'bl':
+    return [f'x{i}' for i in range(8)], ['x0', 'x30'], None, None
+  elif op == 'ret':
+    return ['x0', 'x30'], [], None, None
+  else:
+    return registers[1:], registers[:1], None, None
+
+def block_cycles(instrs):
+  ready = {}  # register -> cycle its value is available
+  slot_ready = {}  # stack slot -> cycle a load of it can start
+  issue = 0
+  finish = 0
+  for instr in instrs:
+    c = cost(instr.op)
+    reads, writes, load, store = effects(instr)
+    start = max([issue] + [ready.get(r, 0) for r in reads] + [slot_ready.get(load, 0)])
+    issue = start + c.throughput
+    for r in writes:
+      ready[r] = start + c.latency
+    if store:
+      slot_ready[store] = start + STORE_TO_LOAD
+    finish = max(finish, start + c.latency)
+  return finish
+
+# === cfg ===
+
+def split_functions(items):
+  """function symbol -> its items, from parse_asm"""
+  functions = {}
+  current = None
+  for item in items:
+    if item.type == 'label' and item.name.startswith('_'):
+      current = functions[item.name] = []
+    if current is not None:
+      current.append(item)
+  return functions
+
+def build_blocks(items):
+  """basic blocks of one function: Tree('block', labels, instrs, position, start, succ), start counted in instructions"""
+  blocks = []
+  block = None
+  index = 0  # of the next instruction
+  for position, item in enumerate(items):
+    if item.type == 'label':
+      if block is None or block.instrs:
+        block = Tree('block', labels=[], instrs=[], position=position, start=index, succ=[])
+        blocks.append(block)
+      block.labels.append(item.name)
+    else:
+      if block is None:
+        block = Tree('block', labels=[], instrs=[], position=position, start=index, succ=[])
+        blocks.append(block)
+      block.instrs.append(item)
+      index += 1
+      if opcode(item.op) in ('b', 'b.cond', 'ret'):
+        block = None
+
+  positions = label_positions(items)
+  block_at = {}  # instruction index -> the block starting there
+  for i, b in reversed(list(enumerate(blocks))):
+    block_at[b.start] = i
+  for i, b in enumerate(blocks):
+    last = b.instrs[-1] if b.instrs else None
+    op = opcode(last.op) if last else None
+    if op in ('b', 'b.cond'):
+      target = resolve_label(positions, last.operands[0], b.start + len(b.instrs) - 1)
+      if target in block_at:  # None, or a label outside this function
+        b.succ.append(block_at[target])
+    if op not in ('b', 'ret') and i + 1 < len(blocks):
+      b.succ.append(i + 1)
+  return blocks
+
+def loop_depths(blocks):
+  """how many natural loops contain each block"""
+  preds = [[] for _ in blocks]
+  for i, b in enumerate(blocks):
+    for s in b.succ:
+      preds[s].append(i)
+
+  # back edges: edges to a block that is still on the dfs stack
+  back_edges = []
+  state = [0] * len(blocks)  # 0 unvisited, 1 on stack, 2 done
+  stack = [(0, iter(blocks[0].succ))] if blocks else []
+  if blocks:
+    state[0] = 1
+  while stack:
+    node, successors = stack[-1]
+    for s in successors:
+      if state[s] == 1:
+        back_edges.append((node, s))
+      elif state[s] == 0:
+        state[s] = 1
+        stack.append((s, iter(blocks[s].succ)))
+        break
+    else:
+      state[node] = 2
+      stack.pop()
+
+  loops = {}  # header -> body
+  for latch, header in back_edges:
+    body = loops.setdefault(header, {header})
+    worklist = [latch]
+    while worklist:
+      n = worklist.pop()
+      if n not in body:
+        body.add(n)
+        worklist.extend(preds[n])
+
+  depths = [0] * len(blocks)
+  for body in loops.values():
+    for n in body:
+      depths[n] += 1
+  return depths
+
+# === reports ===
+
+def analyze(text):
+  """{function: {'cycles': weighted total, 'blocks': [...]}} for the assembly text"""
+  report = {}
+  for name, items in split_functions(parse_asm(text)).items():
+    blocks = build_blocks(items)
+    depths = loop_depths(blocks)
+    rows = []
+    for b, depth in zip(blocks, depths):
+      cycles = block_cycles(b.instrs)
+      rows.append({
+        'block': b.labels[0] if b.labels else f"{name}+{b.position}",
+        'line': b.instrs[0].line if b.instrs else None,
+        'instructions': len(b.instrs),
+        'memory': sum(cost(i.op).memory for i in b.instrs),
+        'depth': depth,
+        'cycles': cycles,
+        'weighted': cycles * LOOP_WEIGHT ** depth,
+      })
+    report[name] = {'cycles': sum(row['weighted'] for row in rows), 'blocks': rows}
+  return report
+
+def print_report(report):
+  for name, function in report.items():
+    print(f"{name}  ~{function['cycles']:g} cycles, loop weighted")
+    print(f"  {'block':<18} {'line':>5} {'depth':>5} {'instrs':>6} {'mem':>4} {'cycles':>7} {'weighted':>9}")
+    for row in function['blocks']:
+      print(f"  {row['block']:<18} {row['line'] or '':>5} {row['depth']:>5} {row['instructions']:>6} {row['memory']:>4} {row['cycles']:>7g} {row['weighted']:>9g}")
+    print()
+
+def print_diff(old, new):
+  for name in sorted(set(old) | set(new)):
+    before = old.get(name, {}).get('cycles')
+    after = new.get(name, {}).get('cycles')
+    if before is None:
+      print(f"{name:<24} {'-':>10} -> {after:>10g}  (new)")
+    elif after is None:
+      print(f"{name:<24} {before:>10g} -> {'-':>10}  (removed)")
+    else:
+      change = f"{100 * (after - before) / before:+.1f}%" if before else ""
+      print(f"{name:<24} {before:>10g} -> {after:>10g}  {change}")
+
+def main():
+  args = sys.argv[1:]
+  if len(args) == 3 and args[0] == '--diff':
+    with open(args[1]) as f, open(args[2]) as g:
+      print_diff(json.load(f), json.load(g))
+  elif (len(args) == 1 and args[0] != '--json') or (len(args) == 2 and args[0] == '--json'):
+    with open(args[-1]) as f:
+      report = analyze(f.read())
+    if args[0] == '--json':
+      print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+      print_report(report)
+  else:
+    print("Usage: python cost_model.py [--json] <file.S> | --diff <old.json> <new.json>")
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,47 @@
+INSTR = 0
+LABEL = 1
+DIRECTIVE = 2
+COMMENT = 3
+
+class Emitter:
+  """
+  Append-only buffer of one function's assembly.
+  Codegen appends records as it walks the tree, and the text is only built once, line by line, when the buffer is written out.
+  Each record is (kind, opcode, operands, comment):
+    (INSTR, 'add', ('x0', 'x0', 'x1'), None)
+    (LABEL, '3', (), None)
+    (DIRECTIVE, '.loc', ('1', '4', '3'), None)
+    (COMMENT, None, (), 'while block')
+  """
+  def __init__(self):
+    self.records = []
+
+  def instr(self, opcode, *operands, comment=None):
+    self.records.append((INSTR, opcode, operands, comment))
+
+  def label(self, name):
+    self.records.append((LABEL, str(name), (), None))
+
+  def directive(self, name, *operands, comment=None):
+    self.records.append((DIRECTIVE, name, operands, comment))
+
+  def comment(self, text):
+    self.records.append((COMMENT, None, (), text))
+
+  def lines(self):
+    for kind, opcode, operands, comment in self.records:
+      if kind == LABEL:
+        yield f"{opcode}:"
+        continue
+      if kind == COMMENT:
+        yield f"\t; {comment}"
+        continue
+      line = f"\t{opcode} {', '.join(operands)}" if operands else f"\t{opcode}"
+      if comment:
+        line += f"  ; {comment}"
+      yield line
+
+  def write_to(self, out):
+    for line in self.lines():
+      out.write(line)
+      out.write("\n")
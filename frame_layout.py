@@ -0,0 +1,97 @@
+from tree import Tree
+from liveness import live_across_calls
+
+# static frame layout, computed before any code for the function is emitted.
+#
+#   x29 + 16   params after the eighth, passed on the stack by the caller
+#   x29 + 8    saved x30
+#   x29        saved x29
+#   x29 - 8    first local
+#   ...        locals, in order of first assignment
+#   ...        spill slots for the register params, when the function makes calls
+#   ...        expression temporaries, one per level of the evaluation stack
+#   ...        outgoing stack arguments, for calls with more than eight
+#   sp         x29 - size, 16-byte aligned
+#
+# sp is moved once in the prologue and never again inside the body, every slot is 8 bytes.
+
+def layout_frame(func, live_after):
+  """live_after is liveness(func)"""
+  variables = {}  # name -> offset below x29
+  max_depth = 0
+  max_outgoing = 0
+  saved = set()  # names live across some call
+
+  def visit_expr(expr, stmt):
+    nonlocal max_depth, max_outgoing
+    max_depth = max(max_depth, temp_depth(expr))
+    max_outgoing = max(max_outgoing, outgoing_args(expr))
+    saved.update(live_across_calls(expr, live_after[id(stmt)]))
+
+  def visit_stmts(stmts):
+    for stmt in stmts:
+      if stmt.type == 'assign':
+        if stmt.var not in func.params and stmt.var not in variables:
+          variables[stmt.var] = 8 * (len(variables) + 1)
+        visit_expr(stmt.expr, stmt)
+      elif stmt.type == 'return':
+        visit_expr(stmt.expr, stmt)
+      elif stmt.type in ('if', 'while'):
+        visit_expr(stmt.condition, stmt)
+        visit_stmts(stmt.block)
+      elif stmt.type == 'ifelse':
+        visit_expr(stmt.condition, stmt)
+        visit_stmts(stmt.if_block)
+        visit_stmts(stmt.else_block)
+      else:
+        raise Exception(f"Unknown stmt type: {stmt.type}")
+  visit_stmts(func.stmts)
+
+  # argument registers are caller-saved, a param that is still needed after a call gets spilled around it
+  saves = {}  # register param index -> offset below x29
+  for i in range(min(len(func.params), ARG_REGISTERS)):
+    if func.params[i] in saved:
+      saves[i] = 8 * (len(variables) + len(saves) + 1)
+
+  temp_base = 8 * (len(variables) + len(saves))
+  outgoing = 8 * max_outgoing
+  size = align16(temp_base + 8 * max_depth + outgoing)
+  return Tree('frame', variables=variables, saves=saves, temp_base=temp_base, max_depth=max_depth, outgoing=outgoing, size=size)
+
+ARG_REGISTERS = 8  # x0-x7, the rest of the arguments go on the stack
+
+def is_simple(expr):
+  """simple arguments are read straight into their register, the others are evaluated into temporaries first"""
+  return expr.type in ('int', 'variable')
+
+def outgoing_args(expr):
+  """how many argument slots on the stack expr's calls need"""
+  if expr.type == 'binop':
+    return max(outgoing_args(expr.left), outgoing_args(expr.right))
+  elif expr.type == 'call':
+    return max([len(expr.args) - ARG_REGISTERS] + [outgoing_args(arg) for arg in expr.args])
+  return 0
+
+def temp_depth(expr):
+  """how many temporaries are live at once while evaluating expr, including its result"""
+  if expr.type in ('int', 'variable'):
+    return 1
+  elif expr.type == 'binop':
+    if expr.right.type == 'int':
+      return temp_depth(expr.left)  # the constant goes straight into the instructions
+    # the left value sits in a temporary while the right side is evaluated
+    return max(temp_depth(expr.left), 1 + temp_depth(expr.right))
+  elif expr.type == 'call':
+    # the values of the complex arguments wait in temporaries until all of them are evaluated
+    depth = 1
+    waiting = 0
+    for arg in expr.args:
+      if not is_simple(arg):
+        depth = max(depth, waiting + temp_depth(arg))
+        waiting += 1
+    return depth
+  else:
+    raise Exception(f"Unknown expr type: {expr.type}")
+
+def align16(n):
+  return (n + 15) & ~15
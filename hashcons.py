@@ -0,0 +1,45 @@
+import weakref
+
+from tree import Tree
+
+# expression nodes (int, variable, binop, call) are hash-consed: building one that is structurally identical to a node
+# that is still alive returns that node.  generated programs repeat the same constants, names and subexpressions a lot,
+# so the parser allocates far fewer of them, and two expressions are equal exactly when they are the same object.
+#
+# sharing only works because the nodes are immutable.  passes that rewrite an expression build a new one with
+# intern_expr instead of assigning to its fields, and expression nodes carry no source position, statements do.
+
+table = weakref.WeakValueDictionary()  # key -> node, entries go away with the last reference to the node
+
+class Expr(Tree):
+  """an interned expression node.  == and hash are the ones from object, identity"""
+  def __setattr__(self, key, value):
+    raise Exception(f"expression nodes are shared and immutable, can't set {key} on {self.type}")
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+def intern_expr(type, **fields):
+  """the shared node for this expression.  children have to be interned already, they are keyed by identity"""
+  if type == 'int':
+    key = (type, fields['value'])
+  elif type == 'variable':
+    key = (type, fields['name'])
+  elif type == 'binop':
+    key = (type, fields['op'], id(fields['left']), id(fields['right']))
+  elif type == 'call':
+    fields['args'] = tuple(fields['args'])
+    key = (type, fields['name'], *(id(arg) for arg in fields['args']))
+  else:
+    raise Exception(f"Unknown expr type: {type}")
+
+  # a key built from ids can't be reused by another node, the node in the table keeps its children alive
+  node = table.get(key)
+  if node is None:
+    node = Expr.__new__(Expr)
+    node.__dict__.update(type=type, **fields)
+    table[key] = node
+  return node
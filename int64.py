@@ -0,0 +1,8 @@
+# the compiled language's integers are the x registers: signed, 64 bits, wrapping
+
+MASK = (1 << 64) - 1
+
+def wrap(value):
+  """wrap to a signed 64-bit integer, like the x registers do"""
+  value &= MASK
+  return value - (1 << 64) if value >> 63 else value
@@ -0,0 +1,196 @@
+"""
+Instruction-level profiler for linux, driving linux_trace.
+
+  python3 kazdb.py [-i sample_interval] [-r START-END ...] program [args...]
+  python3 kazdb.py [-r START-END ...] --trace trace.txt
+
+Single-steps the program under ptrace, then prints:
+  - a flat profile of executed instructions per symbol (or per shared object, outside the program)
+  - the instruction counts in each requested address range
+  - the sampled register state, every sample_interval instructions
+  - an annotated disassembly of the program's functions that ran, each instruction prefixed by how often it ran
+"""
+
+import argparse
+import bisect
+import os
+import subprocess
+import sys
+import tempfile
+
+TRACER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linux_trace')
+
+def run_tracer(program, args, sample_interval):
+  if not os.path.exists(TRACER):
+    print(f"Error: {TRACER} not built, run 'make linux' in kazdb/")
+    sys.exit(1)
+  fd, trace_path = tempfile.mkstemp(prefix='kazdb-', suffix='.txt')
+  os.close(fd)
+  subprocess.check_call([TRACER, '-i', str(sample_interval), '-o', trace_path, program] + args)
+  return trace_path
+
+class Trace:
+  def __init__(self, path):
+    self.counts = {}  # pc -> times executed
+    self.samples = []  # (step, {register: value})
+    self.maps = []  # (start, end, perms, offset, path)
+    self.exe = None
+    self.arch = None
+    self.steps = 0
+    self.exit = None
+    with open(path) as f:
+      for line in f:
+        kind, _, rest = line.rstrip('\n').partition(' ')
+        if kind == 'pc':
+          pc, count = rest.split()
+          self.counts[int(pc, 16)] = int(count)
+        elif kind == 'sample':
+          step, *registers = rest.split()
+          self.samples.append((int(step), {k: int(v, 16) for k, v in (r.split('=') for r in registers)}))
+        elif kind == 'map':
+          addresses, perms, offset, *path = rest.split(' ', 3)
+          start, end = (int(x, 16) for x in addresses.split('-'))
+          self.maps.append((start, end, perms, int(offset, 16), path[0] if path else ''))
+        elif kind == 'exe':
+          self.exe = rest
+        elif kind == 'arch':
+          self.arch = rest
+        elif kind == 'steps':
+          self.steps = int(rest)
+        elif kind in ('exit', 'signal'):
+          self.exit = f"{kind} {rest}"
+
+  def mapping(self, pc):
+    for start, end, perms, offset, path in self.maps:
+      if start <= pc < end:
+        return start, end, perms, offset, path
+    return None
+
+  def load_bias(self):
+    """what to add to the addresses in the program's symbol table to get runtime addresses"""
+    with open(self.exe, 'rb') as f:
+      header = f.read(18)
+    e_type = int.from_bytes(header[16:18], 'little')
+    if e_type != 3:  # ET_DYN, position independent
+      return 0
+    return min(start for start, end, perms, offset, path in self.maps if path == self.exe and offset == 0)
+
+class Symbols:
+  """the program's function symbols, at runtime addresses"""
+  def __init__(self, exe, bias):
+    self.addresses = []
+    self.names = []
+    output = subprocess.run(['nm', '-n', '--defined-only', exe], capture_output=True, text=True).stdout
+    for line in output.splitlines():
+      parts = line.split()
+      if len(parts) == 3 and parts[1] in 'TtWw':
+        self.addresses.append(int(parts[0], 16) + bias)
+        self.names.append(parts[2])
+
+  def lookup(self, pc):
+    i = bisect.bisect_right(self.addresses, pc) - 1
+    if i < 0:
+      return None
+    return self.names[i]
+
+def where(trace, symbols, pc):
+  mapping = trace.mapping(pc)
+  if mapping and mapping[4] == trace.exe:
+    return symbols.lookup(pc) or os.path.basename(trace.exe)
+  if mapping and mapping[4]:
+    return os.path.basename(mapping[4])
+  return '[unknown]'
+
+def flat_profile(trace, symbols):
+  by_symbol = {}
+  for pc, count in trace.counts.items():
+    name = where(trace, symbols, pc)
+    by_symbol[name] = by_symbol.get(name, 0) + count
+
+  total = sum(by_symbol.values())
+  print(f"{trace.steps} instructions, {trace.exit}")
+  print()
+  print(f"{'count':>12} {'%':>6} {'cum %':>6}  symbol")
+  cumulative = 0
+  for name, count in sorted(by_symbol.items(), key=lambda kv: -kv[1]):
+    cumulative += count
+    print(f"{count:>12} {100 * count / total:>6.2f} {100 * cumulative / total:>6.2f}  {name}")
+  return by_symbol
+
+def range_profile(trace, ranges):
+  print()
+  print("address ranges")
+  for start, end in ranges:
+    count = sum(n for pc, n in trace.counts.items() if start <= pc < end)
+    distinct = sum(1 for pc in trace.counts if start <= pc < end)
+    print(f"  0x{start:x}-0x{end:x}  {count} instructions executed, {distinct} distinct")
+
+def print_samples(trace, symbols):
+  if not trace.samples:
+    return
+  print()
+  print("register samples")
+  for step, registers in trace.samples:
+    pc = registers.get('pc', 0)
+    values = " ".join(f"{k}=0x{v:x}" for k, v in registers.items() if k != 'pc')
+    print(f"  #{step:<10} pc=0x{pc:x} <{where(trace, symbols, pc)}>  {values}")
+
+def annotated_disassembly(trace, symbols, bias):
+  """objdump of the program, only the functions that ran, each instruction with its count"""
+  hot = {symbols.lookup(pc) for pc in trace.counts if trace.mapping(pc) and trace.mapping(pc)[4] == trace.exe}
+  output = subprocess.run(['objdump', '-d', '--no-show-raw-insn', trace.exe], capture_output=True, text=True).stdout
+  print()
+  print("annotated disassembly")
+  showing = False
+  for line in output.splitlines():
+    # function headers look like '0000000000401126 <main>:'
+    if line and not line.startswith(' ') and line.endswith('>:'):
+      name = line[line.index('<') + 1:-2]
+      showing = name in hot
+      if showing:
+        print()
+        print(line)
+      continue
+    if not showing or ':' not in line:
+      continue
+    address, _, instruction = line.partition(':')
+    try:
+      pc = int(address.strip(), 16) + bias
+    except ValueError:
+      continue
+    count = trace.counts.get(pc, 0)
+    print(f"{count if count else '':>10}  {pc:x}:{instruction}")
+
+def parse_range(text):
+  start, end = text.split('-')
+  return int(start, 0), int(end, 0)
+
+def main():
+  parser = argparse.ArgumentParser(description="instruction-level profiler, single-steps program with ptrace")
+  parser.add_argument('-i', '--interval', type=int, default=0, help="sample registers every N instructions")
+  parser.add_argument('-r', '--range', action='append', default=[], type=parse_range, help="runtime address range START-END to count, repeatable")
+  parser.add_argument('--trace', help="analyze an existing linux_trace output instead of running the program")
+  parser.add_argument('--no-disassembly', action='store_true')
+  parser.add_argument('program', nargs='?', help="not needed with --trace, the trace records which program ran")
+  parser.add_argument('args', nargs=argparse.REMAINDER)
+  options = parser.parse_args()
+  if not options.trace and not options.program:
+    parser.error("a program to run is required, unless --trace is given")
+
+  trace_path = options.trace or run_tracer(options.program, options.args, options.interval)
+  trace = Trace(trace_path)
+  bias = trace.load_bias()
+  symbols = Symbols(trace.exe, bias)
+
+  flat_profile(trace, symbols)
+  if options.range:
+    range_profile(trace, options.range)
+  print_samples(trace, symbols)
+  if not options.no_disassembly:
+    annotated_disassembly(trace, symbols, bias)
+
+  if not options.trace:
+    os.unlink(trace_path)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,258 @@
+// linux port of macos_trace.c: single-steps a program with ptrace and counts how often each pc executes.
+// the counts are aggregated here and written as text, kazdb.py maps them to symbols and disassembly.
+//
+//   ./linux_trace [-i sample_interval] [-o out.txt] program [args...]
+//
+// output lines:
+//   arch aarch64
+//   exe /abs/path/to/program
+//   pc 0x401000 17                     (one line per distinct pc)
+//   sample 1000 pc=0x... sp=0x... x0=0x... ...
+//   map 0x400000-0x401000 r-xp 00000000 /abs/path/to/program   (from /proc/pid/maps, just before exit)
+//   steps 123456
+//   exit 9
+
+#define _GNU_SOURCE
+#include <elf.h>
+#include <limits.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/personality.h>
+#include <sys/ptrace.h>
+#include <sys/uio.h>
+#include <sys/user.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+// === pc -> count, open addressing ===
+
+typedef struct {
+    uint64_t pc;
+    uint64_t count;
+} entry_t;
+
+static entry_t *table;
+static size_t table_cap = 1 << 16;
+static size_t table_len;
+
+static size_t slot_of(entry_t *t, size_t cap, uint64_t pc) {
+    size_t i = (pc * 0x9E3779B97F4A7C15ull) >> 20;
+    while (1) {
+        i &= cap - 1;
+        if (t[i].count == 0 || t[i].pc == pc) {
+            return i;
+        }
+        i++;
+    }
+}
+
+static void count_pc(uint64_t pc) {
+    if (table_len * 2 >= table_cap) {
+        size_t new_cap = table_cap * 2;
+        entry_t *new_table = calloc(new_cap, sizeof(entry_t));
+        for (size_t i = 0; i < table_cap; i++) {
+            if (table[i].count) {
+                new_table[slot_of(new_table, new_cap, table[i].pc)] = table[i];
+            }
+        }
+        free(table);
+        table = new_table;
+        table_cap = new_cap;
+    }
+    size_t i = slot_of(table, table_cap, pc);
+    if (table[i].count == 0) {
+        table[i].pc = pc;
+        table_len++;
+    }
+    table[i].count++;
+}
+
+// === registers ===
+
+#if defined(__aarch64__)
+#define ARCH "aarch64"
+typedef struct user_pt_regs regs_t;
+
+static int get_regs(pid_t pid, regs_t *regs) {
+    struct iovec iov = { regs, sizeof(*regs) };
+    return ptrace(PTRACE_GETREGSET, pid, (void *)NT_PRSTATUS, &iov);
+}
+
+static uint64_t regs_pc(regs_t *regs) { return regs->pc; }
+
+static void print_sample(FILE *out, uint64_t step, regs_t *regs) {
+    fprintf(out, "sample %llu pc=0x%llx sp=0x%llx", (unsigned long long)step,
+            (unsigned long long)regs->pc, (unsigned long long)regs->sp);
+    for (int i = 0; i < 31; i++) {
+        fprintf(out, " x%d=0x%llx", i, (unsigned long long)regs->regs[i]);
+    }
+    fprintf(out, "\n");
+}
+#elif defined(__x86_64__)
+#define ARCH "x86_64"
+typedef struct user_regs_struct regs_t;
+
+static int get_regs(pid_t pid, regs_t *regs) {
+    return ptrace(PTRACE_GETREGS, pid, NULL, regs);
+}
+
+static uint64_t regs_pc(regs_t *regs) { return regs->rip; }
+
+static void print_sample(FILE *out, uint64_t step, regs_t *regs) {
+    fprintf(out, "sample %llu pc=0x%llx sp=0x%llx rbp=0x%llx rax=0x%llx rbx=0x%llx rcx=0x%llx rdx=0x%llx rdi=0x%llx rsi=0x%llx\n",
+            (unsigned long long)step, regs->rip, regs->rsp, regs->rbp, regs->rax, regs->rbx,
+            regs->rcx, regs->rdx, regs->rdi, regs->rsi);
+}
+#else
+#error "linux_trace supports aarch64 and x86_64"
+#endif
+
+// === tracing ===
+
+static void child_process(char **argv) {
+    if (ptrace(PTRACE_TRACEME, 0, NULL, NULL) < 0) {
+        perror("PTRACE_TRACEME");
+        exit(1);
+    }
+    // fixed load addresses, so runs can be compared with each other
+    personality(ADDR_NO_RANDOMIZE);
+    execvp(argv[0], argv);
+    perror("execvp");
+    exit(1);
+}
+
+static void dump_maps(FILE *out, pid_t pid) {
+    char path[64];
+    snprintf(path, sizeof(path), "/proc/%d/maps", pid);
+    FILE *maps = fopen(path, "r");
+    if (!maps) {
+        return;
+    }
+    char line[PATH_MAX + 128];
+    while (fgets(line, sizeof(line), maps)) {
+        unsigned long long start, end, offset;
+        char perms[8];
+        int path_start = 0;
+        if (sscanf(line, "%llx-%llx %7s %llx %*s %*s %n", &start, &end, perms, &offset, &path_start) >= 4 && path_start) {
+            line[strcspn(line, "\n")] = 0;
+            fprintf(out, "map 0x%llx-0x%llx %s %08llx %s\n", start, end, perms, offset, line + path_start);
+        }
+    }
+    fclose(maps);
+}
+
+static int parent_process(pid_t pid, FILE *out, uint64_t sample_interval) {
+    int status;
+
+    // the child stops with SIGTRAP once execvp succeeds
+    if (waitpid(pid, &status, 0) < 0 || !WIFSTOPPED(status)) {
+        fprintf(stderr, "child did not stop after exec\n");
+        return 1;
+    }
+    ptrace(PTRACE_SETOPTIONS, pid, NULL, (void *)(PTRACE_O_TRACEEXIT | PTRACE_O_EXITKILL));
+
+    uint64_t steps = 0;
+    regs_t regs;
+    int signal_to_deliver = 0;
+    while (1) {
+        if (!signal_to_deliver) {
+            if (get_regs(pid, &regs) < 0) {
+                perror("get_regs");
+                return 1;
+            }
+            count_pc(regs_pc(&regs));
+            if (sample_interval && steps % sample_interval == 0) {
+                print_sample(out, steps, &regs);
+            }
+            steps++;
+        }
+
+        if (ptrace(PTRACE_SINGLESTEP, pid, NULL, (void *)(long)signal_to_deliver) < 0) {
+            perror("PTRACE_SINGLESTEP");
+            return 1;
+        }
+        signal_to_deliver = 0;
+        if (waitpid(pid, &status, 0) < 0) {
+            perror("waitpid");
+            return 1;
+        }
+
+        if (WIFSTOPPED(status) && status >> 8 == (SIGTRAP | (PTRACE_EVENT_EXIT << 8))) {
+            // about to exit, the address space is still there
+            dump_maps(out, pid);
+            ptrace(PTRACE_CONT, pid, NULL, NULL);
+            waitpid(pid, &status, 0);
+        }
+        if (WIFEXITED(status) || WIFSIGNALED(status)) {
+            fprintf(out, "steps %llu\n", (unsigned long long)steps);
+            if (WIFEXITED(status)) {
+                fprintf(out, "exit %d\n", WEXITSTATUS(status));
+            } else {
+                fprintf(out, "signal %d\n", WTERMSIG(status));
+            }
+            return 0;
+        }
+        if (WIFSTOPPED(status) && WSTOPSIG(status) != SIGTRAP) {
+            // a real signal: the instruction didn't run, pass the signal along on the next step
+            signal_to_deliver = WSTOPSIG(status);
+        }
+    }
+}
+
+int main(int argc, char **argv) {
+    uint64_t sample_interval = 0;
+    const char *out_path = NULL;
+    int opt;
+    while ((opt = getopt(argc, argv, "+i:o:")) != -1) {
+        if (opt == 'i') {
+            sample_interval = strtoull(optarg, NULL, 0);
+        } else if (opt == 'o') {
+            out_path = optarg;
+        } else {
+            fprintf(stderr, "usage: %s [-i sample_interval] [-o out.txt] program [args...]\n", argv[0]);
+            return 1;
+        }
+    }
+    if (optind >= argc) {
+        fprintf(stderr, "usage: %s [-i sample_interval] [-o out.txt] program [args...]\n", argv[0]);
+        return 1;
+    }
+
+    FILE *out = out_path ? fopen(out_path, "w") : stdout;
+    if (!out) {
+        perror(out_path);
+        return 1;
+    }
+
+    char exe[PATH_MAX];
+    if (!realpath(argv[optind], exe)) {
+        perror(argv[optind]);
+        return 1;
+    }
+    fprintf(out, "arch %s\n", ARCH);
+    fprintf(out, "exe %s\n", exe);
+
+    table = calloc(table_cap, sizeof(entry_t));
+
+    pid_t pid = fork();
+    if (pid < 0) {
+        perror("Fork failed");
+        return 1;
+    } else if (pid == 0) {
+        child_process(argv + optind);
+    }
+
+    int result = parent_process(pid, out, sample_interval);
+    for (size_t i = 0; i < table_cap; i++) {
+        if (table[i].count) {
+            fprintf(out, "pc 0x%llx %llu\n", (unsigned long long)table[i].pc, (unsigned long long)table[i].count);
+        }
+    }
+    if (out != stdout) {
+        fclose(out);
+    }
+    return result;
+}
@@ -0,0 +1,71 @@
+# which variables are still needed after each statement's expression has been evaluated.
+# codegen uses it to save only the argument registers whose params are read again after a call.
+
+def liveness(func):
+  """id(stmt) -> names read after the stmt's own expression (its condition, for if/ifelse/while) is evaluated"""
+  after = {}
+  live_stmts(func.stmts, set(), after)
+  return after
+
+def live_stmts(stmts, live, after):
+  for stmt in reversed(stmts):
+    live = live_stmt(stmt, live, after)
+  return live
+
+def live_stmt(stmt, live_out, after):
+  """returns what is live before stmt"""
+  if stmt.type == 'assign':
+    after[id(stmt)] = live_out - {stmt.var}
+    return after[id(stmt)] | uses(stmt.expr)
+  elif stmt.type == 'return':
+    after[id(stmt)] = set()
+    return uses(stmt.expr)
+  elif stmt.type == 'if':
+    after[id(stmt)] = live_stmts(stmt.block, live_out, after) | live_out
+    return after[id(stmt)] | uses(stmt.condition)
+  elif stmt.type == 'ifelse':
+    after[id(stmt)] = live_stmts(stmt.if_block, live_out, after) | live_stmts(stmt.else_block, live_out, after)
+    return after[id(stmt)] | uses(stmt.condition)
+  elif stmt.type == 'while':
+    # what is live at the condition depends on the body, which loops back to the condition: iterate until it settles
+    head = live_out | uses(stmt.condition)
+    while True:
+      body = live_stmts(stmt.block, head, after)
+      new_head = live_out | uses(stmt.condition) | body
+      if new_head == head:
+        break
+      head = new_head
+    after[id(stmt)] = live_out | body
+    return head
+  else:
+    raise Exception(f"Unknown stmt type: {stmt.type}")
+
+def uses(expr):
+  if expr.type == 'int':
+    return set()
+  elif expr.type == 'variable':
+    return {expr.name}
+  elif expr.type == 'binop':
+    return uses(expr.left) | uses(expr.right)
+  elif expr.type == 'call':
+    result = set()
+    for arg in expr.args:
+      result |= uses(arg)
+    return result
+  else:
+    raise Exception(f"Unknown expr type: {expr.type}")
+
+def live_across_calls(expr, live):
+  """names live across some call in expr, when live is what is read after expr.  follows the evaluation order of arm_codegen"""
+  if expr.type == 'binop':
+    return live_across_calls(expr.left, live | uses(expr.right)) | live_across_calls(expr.right, live)
+  elif expr.type == 'call':
+    result = set(live)
+    for i, arg in enumerate(expr.args):
+      read_later = set()
+      for j, other in enumerate(expr.args):
+        if j > i or other.type in ('int', 'variable'):
+          read_later |= uses(other)
+      result |= live_across_calls(arg, live | read_later)
+    return result
+  return set()
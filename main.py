@@ -1,4 +1,4 @@
-from compile_ import compile_, compile_v2
+from compile_ import compile_, compile_v2, compile_whole_program
 
 def shell(cmd, **kw):
   import subprocess
@@ -16,11 +16,24 @@ def gen_intermediates(example):
 
 def test(example_name):
   gen_intermediates(f'examples/{example_name}.c')
-  asm = compile_(f'examples/{example_name}.py')
-  write_asm(asm, f'output/{example_name}.S')
+  with open(f'output/{example_name}.S', 'w') as out:
+    compile_(f'examples/{example_name}.py', out)
   shell(f'clang -o bin/{example_name} output/{example_name}.S')
   # shell(f'clang output/{example_name}.S -o bin/{example_name}')
 
+def test_whole_program(example_name):
+  gen_intermediates(f'examples/{example_name}.c')
+  asm = compile_whole_program(f'examples/{example_name}.py')
+  write_asm(asm, f'output/{example_name}.S')
+  shell(f'clang -o bin/{example_name} output/{example_name}.S')
+
+def test_sim(example_name, argc=1):
+  """compile and run on the simulator, no clang or apple hardware needed"""
+  from sim import simulate, print_report
+  asm = compile_(f'examples/{example_name}.py')
+  write_asm(asm, f'output/{example_name}.S')
+  print_report(simulate(asm, argc))
+
 def test2(example_name):
   gen_intermediates(f'examples/{example_name}.c')
   asm = compile_v2(f'examples/{example_name}.py')
@@ -35,6 +48,8 @@ if __name__ == '__main__':
   test2('06_return_ifelse')
   # test2('06_return_if')
   # test('07_return_while')
+  # test_whole_program('02_return_many')
+  # test_sim('07_return_while')
   test2('08_ssa')
 
   
@@ -6,10 +6,14 @@
 #       print(a)
 #   print("Done")
 
+import re
+
 from line_reader import LineReader
 from tree import Tree
+from hashcons import intern_expr
 
 reader = None
+filename = None
 
 def parse_file(file):
   with open(file) as f:
@@ -17,9 +21,10 @@ def parse_file(file):
 
   return parse_content(file, content)
 
-def parse_content(filename, content):
-  global reader
+def parse_content(file, content):
+  global reader, filename
   reader = LineReader(content)
+  filename = file
 
   funcs = []
 
@@ -31,16 +36,18 @@ def parse_content(filename, content):
       print(f'Unknown line: {line}')
       reader.pop()
   
-  return Tree(type='file', filename=filename, funcs=funcs)
+  return Tree(type='file', filename=file, funcs=funcs)
 
 def parse_func():
   def_line = reader.pop()
+  line = reader.index  # 1-based line number of the line we just popped
   assert def_line.startswith('def ')
   def_line = def_line.removeprefix('def ')
   name = def_line.split('(')[0]
-  params = def_line.split('(')[1].removesuffix('):').split(', ')
+  params = def_line.split('(')[1].removesuffix('):')
+  params = params.split(', ') if params else []
   stmts = parse_block(indent = 1)
-  return Tree(type="def", name=name, params=params, stmts=stmts)
+  return Tree(type="def", name=name, params=params, stmts=stmts, filename=filename, line=line, col=1)
 
 def parse_block(indent):
   stmts = []
@@ -56,7 +63,7 @@ def parse_block(indent):
   while i < len(stmts):
     stmt = stmts[i]
     if stmt.type == 'if' and i < len(stmts) - 1 and stmts[i+1].type == 'else':
-      new_stmts.append(Tree(type='ifelse', condition=stmt.condition, if_block=stmt.block, else_block=stmts[i+1].block))
+      new_stmts.append(Tree(type='ifelse', condition=stmt.condition, if_block=stmt.block, else_block=stmts[i+1].block, line=stmt.line, col=stmt.col))
       i += 2
     elif stmt.type == 'else':
       raise Exception("Unexpected 'else' not following an 'if'")
@@ -67,40 +74,100 @@ def parse_block(indent):
   return new_stmts
 
 def parse_stmt(indent):
-  line = reader.pop()
-  line = line.strip()
+  raw_line = reader.pop()
+  line_no = reader.index
+  line = raw_line.strip()
+  col = len(raw_line) - len(raw_line.lstrip()) + 1
+  pos = dict(line=line_no, col=col)
   if line.startswith('return '):
-    return Tree(type='return', expr=parse_expr(line.removeprefix('return ')))
+    return Tree(type='return', expr=parse_expr(line.removeprefix('return ')), **pos)
   elif line.startswith('if ') and line.endswith(':'):
     condition = parse_expr(line.removeprefix('if ').removesuffix(':'))
     block = parse_block(indent=indent+1)
-    return Tree(type='if', condition=condition, block=block)
+    return Tree(type='if', condition=condition, block=block, **pos)
   elif line == "else:":
     block = parse_block(indent=indent+1)
-    return Tree(type='else', block=block)
+    return Tree(type='else', block=block, **pos)
   elif line.startswith('while ') and line.endswith(':'):
     condition = parse_expr(line.removeprefix('while ').removesuffix(':'))
     block = parse_block(indent=indent+1)
-    return Tree(type='while', condition=condition, block=block)
+    return Tree(type='while', condition=condition, block=block, **pos)
   elif ' = ' in line:
-    var, expr = line.split(' = ')
-    return Tree(type='assign', var=var, expr=parse_expr(expr))
+    var, expr = line.split(' = ', 1)
+    return Tree(type='assign', var=var, expr=parse_expr(expr), **pos)
   else:
     assert False, f'Unknown statement: {line}'
 
+# binary operators, loosest first.  all of them are left associative, like python's
+PRECEDENCE = {
+  '==': 1, '!=': 1, '<': 1, '>': 1, '<=': 1, '>=': 1,
+  '<<': 2, '>>': 2,
+  '+': 3, '-': 3,
+  '*': 4, '//': 4, '%': 4,
+}
+TOKEN = re.compile(r'\s*(?:(\d+|\w+|//|<<|>>|<=|>=|==|!=|[-+*%<>(),])|(\S))')
+
+def tokenize(expr):
+  tokens = []
+  for match in TOKEN.finditer(expr):
+    if match.group(2):
+      raise Exception(f"Unexpected character {match.group(2)!r} in expression: {expr}")
+    if match.group(1):
+      tokens.append(match.group(1))
+  return tokens
+
 def parse_expr(expr):
-  if ' ' in expr.strip() and len(expr.split(' ')) == 3:
-    parts = expr.split(' ')
-    left, op, right = parts
-    return Tree(type='binop', left=parse_expr(left), op=op, right=parse_expr(right))
-  elif '(' in expr and expr.endswith(')'):
-    if expr[0] == '(':
-      return parse_expr(expr[1:-1])
-    else:
-      function_name = expr.split('(')[0]
-      args = expr.removeprefix(function_name + '(').removesuffix(')').split(', ')
-      return Tree(type='call', name=function_name, args=[parse_expr(x.strip()) for x in args])
-  elif expr.isnumeric():
-    return Tree(type='int', value=int(expr))
-  else:
-    return Tree(type='variable', name=expr)
\ No newline at end of file
+  """expressions are interned and shared, so unlike statements they don't record a source position"""
+  tokens = tokenize(expr)
+  node, i = parse_binary(tokens, 0, 0)
+  if i != len(tokens):
+    raise Exception(f"Unexpected {tokens[i]!r} in expression: {expr}")
+  return node
+
+def parse_binary(tokens, i, min_precedence):
+  """precedence climbing: parses from tokens[i] for as long as the operators bind at least as tightly as min_precedence"""
+  left, i = parse_primary(tokens, i)
+  while i < len(tokens) and PRECEDENCE.get(tokens[i], -1) >= min_precedence:
+    op = tokens[i]
+    right, i = parse_binary(tokens, i + 1, PRECEDENCE[op] + 1)
+    if PRECEDENCE[op] == 1 and i < len(tokens) and PRECEDENCE.get(tokens[i]) == 1:
+      raise Exception(f"Chained comparisons are not supported: {' '.join(tokens)}")
+    left = intern_expr('binop', left=left, op=op, right=right)
+  return left, i
+
+def parse_primary(tokens, i):
+  token = expect(tokens, i)
+  if token == '(':
+    node, i = parse_binary(tokens, i + 1, 0)
+    return node, expect(tokens, i, ')')
+  elif token == '-':
+    operand, i = parse_primary(tokens, i + 1)
+    if operand.type == 'int':
+      return intern_expr('int', value=-operand.value), i
+    return intern_expr('binop', left=intern_expr('int', value=0), op='-', right=operand), i
+  elif token.isdigit():
+    return intern_expr('int', value=int(token)), i + 1
+  elif token.isidentifier():
+    if i + 1 < len(tokens) and tokens[i + 1] == '(':
+      args = []
+      i += 2
+      if expect(tokens, i) != ')':
+        while True:
+          arg, i = parse_binary(tokens, i, 0)
+          args.append(arg)
+          if expect(tokens, i) != ',':
+            break
+          i += 1
+      return intern_expr('call', name=token, args=args), expect(tokens, i, ')')
+    return intern_expr('variable', name=token), i + 1
+  raise Exception(f"Unexpected {token!r} in expression: {' '.join(tokens)}")
+
+def expect(tokens, i, token=None):
+  """the token at i.  when a token is given, checks that it is the one at i and returns the index after it"""
+  if i >= len(tokens):
+    raise Exception(f"Unexpected end of expression: {' '.join(tokens)}")
+  if token is None:
+    return tokens[i]
+  if tokens[i] != token:
+    raise Exception(f"Expected {token!r}, found {tokens[i]!r} in expression: {' '.join(tokens)}")
+  return i + 1
@@ -3,6 +3,7 @@ import sys
 import termios
 import tty
 import shutil
+import struct
 from pathlib import Path
 
 # Add LLDB Python path for macOS
@@ -12,6 +13,49 @@ if LLDB_PYTHON_PATH not in sys.path:
 
 import lldb
 
+STEP_COMMANDS = ['n', 'next', 's', 'step', 'ni', 'si']
+MAX_STACK_SLOTS = 4096  # fp and sp can be garbage before the prologue runs, don't read megabytes then
+LOG_TOP = 31  # first row of the logging panel, which spans the whole width.  main output stays above it
+
+class Screen:
+    """
+    Back buffer for the panels.  Draws only write cells here, flush() sends the cells that changed since the last flush.
+    The main area isn't tracked: anything printed there has to stay left of the side panel and above the logging panel.
+    """
+    def __init__(self):
+        self.front = {}  # row -> list of characters currently on the terminal
+        self.back = {}   # row -> list of characters to show at the next flush
+
+    def put(self, row, col, text):
+        line = self.back.setdefault(row, [])
+        end = col - 1 + len(text)
+        if len(line) < end:
+            line.extend([None] * (end - len(line)))
+        line[col - 1:end] = text
+
+    def invalidate(self):
+        """forget what is on the terminal, so the next flush repaints every cell"""
+        self.front = {}
+
+    def flush(self):
+        out = []
+        for row, line in self.back.items():
+            front = self.front.get(row, [])
+            col = 0
+            while col < len(line):
+                if line[col] is None or (col < len(front) and front[col] == line[col]):
+                    col += 1
+                    continue
+                # a run of changed cells goes out with a single cursor move
+                start = col
+                while col < len(line) and line[col] is not None and not (col < len(front) and front[col] == line[col]):
+                    col += 1
+                out.append(f"\033[{row};{start + 1}H" + "".join(line[start:col]))
+            self.front[row] = list(line)
+        # reset cursor position for main display, even when no cell changed, so the main area never scrolls the panels
+        print("".join(out) + "\033[H", end='')
+        sys.stdout.flush()
+
 class SimpleLLDBFrontend:
     def __init__(self, program_path=None):
         self.debugger = lldb.SBDebugger.Create()
@@ -23,6 +67,8 @@ class SimpleLLDBFrontend:
         self.side_panel_width = 45
         self.main_width = self.term_width - self.side_panel_width - 1
         self.logs = ["Welcome to Simple LLDB Frontend"]
+        self.screen = Screen()
+        self.snapshot_cache = None  # (stop id, registers, stack values)
         
         if program_path:
             self.load_program(program_path)
@@ -31,9 +77,9 @@ class SimpleLLDBFrontend:
         error = lldb.SBError()
         self.target = self.debugger.CreateTarget(program_path, None, None, True, error)
         if not error.Success():
-            print(f"\r\033[K Error loading program: {error.GetCString()}")
+            print(f"{self.clear_line()} Error loading program: {error.GetCString()}")
         else:
-            print(f"\r\033[K Loaded program: {program_path}")
+            print(f"{self.clear_line()} Loaded program: {program_path}")
             self.handle_command("b main", suppress_prompt=True)
   
     def get_register_values(self):
@@ -79,139 +125,130 @@ class SimpleLLDBFrontend:
         
         return registers
 
-    def get_stack_values(self):
-        if not self.process or self.process.GetState() != lldb.eStateStopped:
-            return []
-            
-        thread = self.process.GetSelectedThread()
-        if not thread:
+    def get_stack_values(self, registers):
+        values = dict(registers)
+        if 'x29' not in values or 'sp' not in values:
             return []
-            
-        frame = thread.GetFrameAtIndex(0)
-        if not frame:
-            return []
-            
-        # Get FP and SP values
-        fp_reg = frame.FindRegister('x29')
-        sp_reg = frame.FindRegister('sp')
-        
-        if not fp_reg or not sp_reg:
-            return []
-            
-        try:
-            fp = int(fp_reg.GetValue(), 16) if fp_reg.GetValue().startswith('0x') else int(fp_reg.GetValue())
-            sp = int(sp_reg.GetValue(), 16) if sp_reg.GetValue().startswith('0x') else int(sp_reg.GetValue())
-        except (ValueError, AttributeError):
-            self.logs.append("Error reading FP/SP registers")
+        fp, sp = values['x29'], values['sp']
+
+        # all the slots from FP + 16 down to SP - 16, read in one go
+        top = fp + 16
+        count = (top - (sp - 16)) // 8 + 1
+        if count <= 0:
             return []
-        
+        count = min(count, MAX_STACK_SLOTS)
+        start = top - 8 * (count - 1)
+
         error = lldb.SBError()
-        stack_values = []
-        
-        # Read all values from FP down to SP
-        current_addr = fp + 16
-        while current_addr >= sp - 16:
-            value = self.process.ReadPointerFromMemory(current_addr, error)
-            if error.Success():
-                stack_values.append((current_addr, value))
-            current_addr -= 8
+        data = self.process.ReadMemory(start, 8 * count, error)
+        if not error.Success() or not data:
+            self.logs.append(f"Error reading stack at 0x{start:x}: {error.GetCString()}")
+            return []
 
+        view = memoryview(data)[:len(data) - len(data) % 8]
+        stack_values = [(start + 8 * i, value) for i, (value,) in enumerate(struct.iter_unpack('<Q', view))]
+        stack_values.reverse()  # FP side first
         return stack_values
-    
+
+    def snapshot(self):
+        """registers and stack at the current stop, read from the process once per stop"""
+        if not self.process or self.process.GetState() != lldb.eStateStopped:
+            return self.get_register_values(), []
+        stop_id = self.process.GetStopID()
+        if self.snapshot_cache is None or self.snapshot_cache[0] != stop_id:
+            registers = self.get_register_values()
+            self.snapshot_cache = (stop_id, registers, self.get_stack_values(registers))
+        return self.snapshot_cache[1], self.snapshot_cache[2]
+
     def draw_logging_panel(self):
-        # Clear the entire bottom
-        for i in range(10):
-            print(f"\033[{i+31};1H\033[K\n", end='')
-        
+        put = self.screen.put
+
         # Draw box border - top
         title = "═" * (self.term_width-2)
-        print(f"\033[31;1H╔{title}╗\n", end='')
-        
+        put(LOG_TOP, 1, f"╔{title}╗")
+
         # Logging section
-        current_line = 32
+        current_line = LOG_TOP + 1
         log_title = "Logging:"
         padding = self.term_width - len(log_title) - 3
-        print(f"\033[{current_line};1H║ {log_title}{' ' * padding}║\n", end='')
+        put(current_line, 1, f"║ {log_title}{' ' * padding}║")
         current_line += 1
-        
+
         # Show logs
         for log in self.logs:
             if current_line >= 40:
                 break
+            log = log[:self.term_width - 3]
             padding = self.term_width - len(log) - 3
-            print(f"\033[{current_line};1H║ {log}{' ' * padding}║\n", end='')
+            put(current_line, 1, f"║ {log}{' ' * padding}║")
             current_line += 1
 
         # Fill any remaining space
         while current_line < 40:
-            print(f"\033[{current_line};1H║{' ' * (self.term_width-2)}║\n", end='')
+            put(current_line, 1, f"║{' ' * (self.term_width-2)}║")
             current_line += 1
-        
-        # Draw box border - bottom
-        print(f"\033[{current_line};1H╚{title}╝\n", end='')
-
-        # Reset cursor position for main display
-        print("\033[H", end='')
-        sys.stdout.flush()
 
+        # Draw box border - bottom
+        put(current_line, 1, f"╚{title}╝")
 
     def draw_side_panel(self):
-        registers = self.get_register_values()
-        stack_values = self.get_stack_values()
-        
-        # Clear the entire right side
-        for i in range(20):
-            print(f"\033[{i+1};{self.main_width+1}H\033[K\n", end='')
-        
+        registers, stack_values = self.snapshot()
+        put = self.screen.put
+        col = self.main_width + 1
+
         # Draw box border - top
         title = "═" * (self.side_panel_width-2)
-        print(f"\033[1;{self.main_width+1}H╔{title}╗\n", end='')
-        
+        put(1, col, f"╔{title}╗")
+
         # Register section
         current_line = 2
         reg_title = "Registers:"
         padding = self.side_panel_width - len(reg_title) - 3
-        print(f"\033[{current_line};{self.main_width+1}H║ {reg_title}{' ' * padding}║\n", end='')
+        put(current_line, col, f"║ {reg_title}{' ' * padding}║")
         current_line += 1
-        
+
         for reg_name, value in registers:
             name_display = 'fp' if reg_name == 'x29' else reg_name
             row = f"{name_display:>3} = 0x{value:016x}"
             padding = self.side_panel_width - len(row) - 3
-            print(f"\033[{current_line};{self.main_width+1}H║ {row}{' ' * padding}║\n", end='')
+            put(current_line, col, f"║ {row}{' ' * padding}║")
             current_line += 1
-        
+
         # Stack section
-        print(f"\033[{current_line};{self.main_width+1}H║{' ' * (self.side_panel_width-2)}║\n", end='')
+        put(current_line, col, f"║{' ' * (self.side_panel_width-2)}║")
         current_line += 1
-        
+
         stack_title = "Stack (FP → SP):"
         padding = self.side_panel_width - len(stack_title) - 3
-        print(f"\033[{current_line};{self.main_width+1}H║ {stack_title}{' ' * padding}║\n", end='')
+        put(current_line, col, f"║ {stack_title}{' ' * padding}║")
         current_line += 1
-        
+
         # Show stack values
         if registers and len(registers) > 3:  # Make sure we have FP register
-            fp_value = registers[3][1]  # FP is the fourth register (x29)
             for addr, value in stack_values:
                 if current_line >= 29:  # Leave room for bottom border
                     break
                 row = f"[0x{addr:016x}] 0x{value:016x}"
                 padding = self.side_panel_width - len(row) - 3
-                print(f"\033[{current_line};{self.main_width+1}H║ {row}{' ' * padding}║\n", end='')
+                put(current_line, col, f"║ {row}{' ' * padding}║")
                 current_line += 1
-        
+
         # Fill any remaining space
         while current_line < 30:
-            print(f"\033[{current_line};{self.main_width+1}H║{' ' * (self.side_panel_width-2)}║\n", end='')
+            put(current_line, col, f"║{' ' * (self.side_panel_width-2)}║")
             current_line += 1
-        
+
         # Draw box border - bottom
-        print(f"\033[{current_line};{self.main_width+1}H╚{title}╝\n", end='')
-        
-        # Reset cursor position for main display
-        print("\033[H", end='')
-        sys.stdout.flush()
+        put(current_line, col, f"╚{title}╝")
+
+    def redraw(self):
+        self.draw_side_panel()
+        self.draw_logging_panel()
+        self.screen.flush()
+
+    def clear_line(self):
+        """clears the main area of the current line.  unlike \\033[K, this leaves the side panel alone"""
+        return f"\r{' ' * self.main_width}\r"
 
     def cleanup_ui(self):
         if self.original_terminal_settings:
@@ -223,9 +260,15 @@ class SimpleLLDBFrontend:
         print('\033[2J\033[H', end='', flush=True)
     
     def show_prompt(self, command=""):
-        print(f'\r\033[K{" " * self.main_width}', end='')
-        print('\r\033[Klldb> ' + command, end='', flush=True)
+        print(self.clear_line() + 'lldb> ' + command, end='', flush=True)
     
+    def parse_repeat(self, command):
+        """'n 10' -> ('n', 10), anything else -> (command, 1)"""
+        parts = command.split()
+        if len(parts) == 2 and parts[0] in STEP_COMMANDS and parts[1].isdigit():
+            return parts[0], int(parts[1])
+        return command, 1
+
     def handle_command(self, command, suppress_prompt=False):
         if not command:
             return True
@@ -239,6 +282,8 @@ class SimpleLLDBFrontend:
             if self.process:
                 self.process.Kill()
                 self.process = None
+            # stop ids start over in the new process
+            self.snapshot_cache = None
             # Create new process and run
             error = lldb.SBError()
             self.process = self.target.Launch(
@@ -254,33 +299,46 @@ class SimpleLLDBFrontend:
                 error
             )
             if not error.Success():
-                print(f'\r\033[KError launching process: {error.GetCString()}')
+                print(f'{self.clear_line()}Error launching process: {error.GetCString()}')
                 return True
         else:
-            # Handle all other commands normally
-            result = lldb.SBCommandReturnObject()
-            self.debugger.GetCommandInterpreter().HandleCommand(command, result)
+            # Handle all other commands normally.  "n 10" steps 10 times and only shows the last step
+            command, repeat = self.parse_repeat(command)
+            for i in range(repeat):
+                result = lldb.SBCommandReturnObject()
+                self.debugger.GetCommandInterpreter().HandleCommand(command, result)
+                if not result.Succeeded():
+                    break
+                if command in STEP_COMMANDS + ['c', 'continue']:
+                    self.process = self.target.GetProcess()
+                    if not self.process or self.process.GetState() != lldb.eStateStopped:
+                        break
             
             if result.Succeeded():
                 output = result.GetOutput()
                 if output:
-                    for line in output.rstrip().split('\n'):
-                        print(f'\r\033[K{line[:self.main_width]}')
+                    lines = output.rstrip().split('\n')
+                    if repeat > 1:
+                        lines.insert(0, f'(step {i + 1} of {repeat})')
+                    # the prompt is on row 1, the output starts on row 2 and the blank line and next prompt follow it
+                    room = LOG_TOP - 4
+                    if len(lines) > room:
+                        lines = lines[:room - 1] + [f'... {len(lines) - room + 1} more lines']
+                    for line in lines:
+                        print(f'{self.clear_line()}{line[:self.main_width]}')
                     if not suppress_prompt:
                         print()
                     
                     # Update process reference after relevant commands
-                    if command in ['n', 'next', 's', 'step', 'c', 'continue']:
+                    if command in STEP_COMMANDS + ['c', 'continue']:
                         self.process = self.target.GetProcess()
             else:
-                print(f'\r\033[KError: {result.GetError()[:self.main_width]}')
+                print(f'{self.clear_line()}Error: {result.GetError()[:self.main_width]}')
                 if not suppress_prompt:
                     print()
         
         # Always update the side panel
-        self.draw_side_panel()
-        self.draw_logging_panel()
-        sys.stdout.flush()
+        self.redraw()
         return True
     
     def run(self):
@@ -288,11 +346,12 @@ class SimpleLLDBFrontend:
             self.init_ui()
             running = True
             
-            print('\r\033[KSimple LLDB Frontend - Type "help" for commands')
-            print('\r\033[KCommon commands: run (r), next (n), step (s), continue (c)')
+            print(f'{self.clear_line()}Simple LLDB Frontend - Type "help" for commands')
+            print(f'{self.clear_line()}Common commands: run (r), next (n), step (s), continue (c)')
+            print(f'{self.clear_line()}n 10, s 10, ni 10, si 10: step 10 times, redrawing once at the end')
             print()
             
-            self.draw_side_panel()
+            self.redraw()
             current_command = ""
             self.show_prompt()
             
@@ -319,7 +378,8 @@ class SimpleLLDBFrontend:
                     running = False
                 elif char == '\x0c':
                     self.logs = []
-                    self.draw_logging_panel()
+                    self.screen.invalidate()
+                    self.redraw()
                 
         finally:
             print()
@@ -0,0 +1,124 @@
+"""
+Long-lived compile server, so a build that compiles thousands of files pays for python startup and imports once.
+
+Requests and responses are newline-delimited JSON, either over stdin/stdout or over a unix socket:
+  {"id": 1, "file": "examples/05_return_sum.py"}
+  {"id": 2, "filename": "foo.py", "source": "def main():\\n  return 1\\n"}
+  {"id": 3, "file": "examples/05_return_sum.py", "output": "output/05_return_sum.S"}
+Each response carries the request's id plus either "asm" (or "output", when the asm was written to a file) or "error".
+Responses can come back out of order.
+
+  python server.py                          # serve on stdin/stdout
+  python server.py --socket /tmp/subpython.sock
+"""
+
+import functools
+import json
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from compile_ import compile_content
+
+# the parser and codegen keep their state in module globals, so each compile runs in a worker process, one at a time there.
+# threads in the server only read sources, write outputs, talk to clients and wait on the workers.
+compile_pool = None
+
+def start_workers(workers):
+  global compile_pool
+  compile_pool = ProcessPoolExecutor(max_workers=workers, initializer=quiet_worker)
+
+def quiet_worker():
+  # the compiler prints debug output, and in stdio mode the worker's stdout is the response stream
+  sys.stdout = sys.stderr
+
+@functools.lru_cache(maxsize=4096)
+def compile_cached(filename, content):
+  """runs in the workers, each keeps its own warm cache"""
+  return compile_content(filename, content)
+
+def handle_request(request):
+  response = {'id': request.get('id')}
+  try:
+    if 'source' in request:
+      filename, content = request.get('filename', '<source>'), request['source']
+    else:
+      filename = request['file']
+      with open(filename) as f:
+        content = f.read()
+
+    asm = compile_pool.submit(compile_cached, filename, content).result()
+
+    if 'output' in request:
+      with open(request['output'], 'w') as f:
+        f.write(asm)
+      response['output'] = request['output']
+    else:
+      response['asm'] = asm
+  except Exception as e:
+    response['error'] = f"{type(e).__name__}: {e}"
+  return response
+
+def handle_line(line):
+  try:
+    request = json.loads(line)
+  except json.JSONDecodeError as e:
+    return {'id': None, 'error': f"bad request: {e}"}
+  if not isinstance(request, dict):
+    return {'id': None, 'error': f"bad request: expected a json object, got {type(request).__name__}"}
+  return handle_request(request)
+
+def serve_stdio(threads):
+  out = sys.stdout
+  write_lock = threading.Lock()
+
+  def respond(line):
+    response = json.dumps(handle_line(line))
+    with write_lock:
+      out.write(response + '\n')
+      out.flush()
+
+  with ThreadPoolExecutor(max_workers=threads) as pool:
+    for line in sys.stdin:
+      if line.strip():
+        pool.submit(respond, line)
+
+class CompileHandler(socketserver.StreamRequestHandler):
+  def handle(self):
+    for line in self.rfile:
+      if line.strip():
+        self.wfile.write(json.dumps(handle_line(line)).encode() + b'\n')
+        self.wfile.flush()
+
+class CompileServer(socketserver.ThreadingUnixStreamServer):
+  daemon_threads = True
+
+def serve_socket(path):
+  if os.path.exists(path):
+    os.unlink(path)
+  with CompileServer(path, CompileHandler) as server:
+    print(f"serving on {path}", file=sys.stderr)
+    try:
+      server.serve_forever()
+    finally:
+      os.unlink(path)
+
+def main():
+  args = sys.argv[1:]
+  workers = os.cpu_count() or 4
+  if args[:1] == ['--socket'] and len(args) == 2:
+    start_workers(workers)
+    serve_socket(args[1])
+  elif not args:
+    start_workers(workers)
+    # a few requests per worker in flight, so the workers don't wait on file io between compiles
+    serve_stdio(threads=4 * workers)
+  else:
+    print("Usage: python server.py [--socket <path>]", file=sys.stderr)
+    sys.exit(1)
+  compile_pool.shutdown()
+
+if __name__ == '__main__':
+  main()
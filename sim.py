@@ -0,0 +1,366 @@
+"""
+Simulator for the subset of AArch64 that arm_codegen emits, so generated code can be run and measured on any host.
+
+  python sim.py output/07_return_while.S [argc]
+
+The assembly is decoded once into parallel arrays of integer opcodes and operands, then run from _main with x0 = argc.
+Reports the exit value, how many instructions of each opcode ran, memory traffic, and an approximate cycle count.
+"""
+
+import struct
+import sys
+from array import array
+
+from asm_parse import parse_asm, parse_memory, parse_immediate, opcode, branch_condition, label_positions, resolve_label
+from cost_model import COSTS
+from int64 import MASK, wrap
+
+# decoded opcodes
+(MOV_IMM, MOV_REG, ADD_IMM, ADD_REG, SUB_IMM, SUB_REG, LDR, STR, LDP, STP, CMP_IMM, CMP_REG, CSET, B, B_COND, BL, RET,
+ MOVZ, MOVN, MOVK, ADD_LSL, NEG, MUL, UMULH, SDIV, MSUB, LSL_IMM, LSL_REG, LSR_IMM, LSR_REG, ASR_IMM, ASR_REG,
+ AND_IMM, AND_REG, EOR_REG) = range(35)
+
+OPCODE_NAMES = {
+  MOV_IMM: 'mov', MOV_REG: 'mov', ADD_IMM: 'add', ADD_REG: 'add', SUB_IMM: 'sub', SUB_REG: 'sub',
+  LDR: 'ldr', STR: 'str', LDP: 'ldp', STP: 'stp', CMP_IMM: 'cmp', CMP_REG: 'cmp', CSET: 'cset',
+  B: 'b', B_COND: 'b.cond', BL: 'bl', RET: 'ret',
+  MOVZ: 'movz', MOVN: 'movn', MOVK: 'movk', ADD_LSL: 'add', NEG: 'neg', MUL: 'mul', UMULH: 'umulh', SDIV: 'sdiv', MSUB: 'msub',
+  LSL_IMM: 'lsl', LSL_REG: 'lsl', LSR_IMM: 'lsr', LSR_REG: 'lsr', ASR_IMM: 'asr', ASR_REG: 'asr',
+  AND_IMM: 'and', AND_REG: 'and', EOR_REG: 'eor',
+}
+# three register opcodes: rd = rn op rm
+REGISTER_OPS = {'mul': MUL, 'umulh': UMULH, 'sdiv': SDIV, 'eor': EOR_REG}
+# opcodes with an immediate and a register form
+SHIFT_OPS = {'lsl': (LSL_IMM, LSL_REG), 'lsr': (LSR_IMM, LSR_REG), 'asr': (ASR_IMM, ASR_REG), 'and': (AND_IMM, AND_REG)}
+
+# bytes moved by each memory opcode
+LOADS = {LDR: 8, LDP: 16}
+STORES = {STR: 8, STP: 16}
+
+SP = 31
+XZR = 32
+CONDITIONS = {'eq': 0, 'ne': 1, 'lt': 2, 'gt': 3, 'le': 4, 'ge': 5}  # the ones condition() evaluates
+
+STACK_TOP = 0x7ff000000000
+STACK_SIZE = 1 << 20
+EXIT = -1  # return address of _main
+MAX_STEPS = 100_000_000
+
+class SimError(Exception):
+  pass
+
+def register(name):
+  if name == 'sp':
+    return SP
+  if name in ('xzr', 'wzr'):
+    return XZR
+  if name[0] in 'xw' and name[1:].isdigit() and int(name[1:]) <= 30:
+    return int(name[1:])
+  raise SimError(f"Unknown register: {name}")
+
+def shift_amount(operand):
+  """'lsl #16' -> 16, for the optional shift on movz/movk/add"""
+  kind, amount = operand.split()
+  if kind != 'lsl':
+    raise SimError(f"Unsupported shift: {operand}")
+  return parse_immediate(amount)
+
+def truncating_divide(a, b):
+  """sdiv: rounds towards zero, and dividing by zero gives zero instead of trapping"""
+  if b == 0:
+    return 0
+  q = abs(a) // abs(b)
+  return wrap(q if (a < 0) == (b < 0) else -q)
+
+class Program:
+  """the assembly, decoded into parallel arrays indexed by instruction number"""
+  def __init__(self, text):
+    items = parse_asm(text)
+    self.instrs = [item for item in items if item.type == 'instr']
+    n = len(self.instrs)
+    self.op = array('B', bytes(n))
+    self.a = array('q', bytes(8 * n))
+    self.b = array('q', bytes(8 * n))
+    self.c = array('q', bytes(8 * n))
+
+    # labels point at the index of the instruction that follows them
+    self.labels = label_positions(items)
+    self.symbols = {name: positions[0] for name, positions in self.labels.items() if not name.isdigit()}
+
+    self.function_starts = sorted((i, name) for name, i in self.symbols.items() if name.startswith('_'))
+    for i, instr in enumerate(self.instrs):
+      self.decode(i, instr)
+
+  def target(self, i, name):
+    target = resolve_label(self.labels, name, i)
+    if target is None:
+      raise SimError(f"Unknown label {name} at line {self.instrs[i].line}")
+    return target
+
+  def decode(self, i, instr):
+    op, operands = instr.op, instr.operands
+    def put(code, a=0, b=0, c=0):
+      self.op[i], self.a[i], self.b[i], self.c[i] = code, a, b, c
+
+    if op == 'mov':
+      if operands[1].startswith('#'):
+        put(MOV_IMM, register(operands[0]), parse_immediate(operands[1]))
+      else:
+        put(MOV_REG, register(operands[0]), register(operands[1]))
+    elif op in ('movz', 'movn', 'movk'):
+      value = parse_immediate(operands[1])
+      shift = shift_amount(operands[2]) if len(operands) > 2 else 0
+      if op == 'movk':
+        put(MOVK, register(operands[0]), value, shift)
+      else:
+        put(MOVZ if op == 'movz' else MOVN, register(operands[0]), wrap(value << shift if op == 'movz' else ~(value << shift)))
+    elif op == 'add' and len(operands) == 4 and not operands[2].startswith('#'):
+      put(ADD_LSL, register(operands[0]), register(operands[1]), register(operands[2]) | shift_amount(operands[3]) << 8)
+    elif op in ('add', 'sub'):
+      if operands[2].startswith('#'):
+        shift = shift_amount(operands[3]) if len(operands) > 3 else 0
+        put(ADD_IMM if op == 'add' else SUB_IMM, register(operands[0]), register(operands[1]), parse_immediate(operands[2]) << shift)
+      else:
+        put(ADD_REG if op == 'add' else SUB_REG, register(operands[0]), register(operands[1]), register(operands[2]))
+    elif op in ('ldr', 'str', 'ldur', 'stur'):
+      base, offset = parse_memory(operands[1])
+      put(LDR if op in ('ldr', 'ldur') else STR, register(operands[0]), register(base), offset)
+    elif op in ('ldp', 'stp'):
+      base, offset = parse_memory(operands[2])
+      # both registers fit in one field, the second one shifted up a byte
+      put(LDP if op == 'ldp' else STP, register(operands[0]) | register(operands[1]) << 8, register(base), offset)
+    elif op == 'neg':
+      put(NEG, register(operands[0]), register(operands[1]))
+    elif op in REGISTER_OPS:
+      put(REGISTER_OPS[op], register(operands[0]), register(operands[1]), register(operands[2]))
+    elif op == 'msub':
+      # the addend shares a field with the second factor
+      put(MSUB, register(operands[0]), register(operands[1]), register(operands[2]) | register(operands[3]) << 8)
+    elif op in SHIFT_OPS:
+      immediate, reg = SHIFT_OPS[op]
+      if operands[2].startswith('#'):
+        put(immediate, register(operands[0]), register(operands[1]), parse_immediate(operands[2]))
+      else:
+        put(reg, register(operands[0]), register(operands[1]), register(operands[2]))
+    elif op == 'cmp':
+      if operands[1].startswith('#'):
+        put(CMP_IMM, register(operands[0]), parse_immediate(operands[1]))
+      else:
+        put(CMP_REG, register(operands[0]), register(operands[1]))
+    elif op == 'cset':
+      put(CSET, register(operands[0]), CONDITIONS[operands[1]])
+    elif op == 'b':
+      put(B, self.target(i, operands[0]))
+    elif opcode(op) == 'b.cond' and branch_condition(op) in CONDITIONS:
+      put(B_COND, self.target(i, operands[0]), CONDITIONS[branch_condition(op)])
+    elif op == 'bl':
+      put(BL, self.target(i, operands[0]))
+    elif op == 'ret':
+      put(RET)
+    else:
+      raise SimError(f"Unsupported instruction at line {instr.line}: {op} {', '.join(operands)}")
+
+  def function_of(self, i):
+    name = None
+    for start, symbol in self.function_starts:
+      if start > i:
+        break
+      name = symbol
+    return name
+
+def run(program, argc=1, max_steps=MAX_STEPS):
+  """runs _main, returns (x0 at exit, how many times each instruction ran)"""
+  op, A, B_, C = program.op, program.a, program.b, program.c
+  regs = [0] * 33
+  regs[0] = argc
+  regs[SP] = STACK_TOP
+  regs[30] = EXIT
+  memory = bytearray(STACK_SIZE)
+  base = STACK_TOP - STACK_SIZE
+  unpack, pack = struct.unpack_from, struct.pack_into
+  counts = [0] * len(op)
+  left, right = 0, 0  # operands of the last cmp
+
+  if '_main' not in program.symbols:
+    raise SimError("No _main")
+  pc = program.symbols['_main']
+  steps = 0
+  try:
+    while pc != EXIT:
+      steps += 1
+      if steps > max_steps:
+        raise SimError(f"Gave up after {max_steps} steps")
+      counts[pc] += 1
+      code = op[pc]
+      a = A[pc]
+      if code == LDR:
+        address = regs[B_[pc]] + C[pc] - base
+        if address < 0:
+          raise struct.error  # unpack_from would count a negative offset from the end
+        regs[a] = unpack('<q', memory, address)[0]
+      elif code == STR:
+        address = regs[B_[pc]] + C[pc] - base
+        if address < 0:
+          raise struct.error
+        pack('<q', memory, address, regs[a])
+      elif code == MOV_IMM:
+        regs[a] = B_[pc]
+      elif code == MOV_REG:
+        regs[a] = regs[B_[pc]]
+      elif code == ADD_REG:
+        regs[a] = wrap(regs[B_[pc]] + regs[C[pc]])
+      elif code == SUB_REG:
+        regs[a] = wrap(regs[B_[pc]] - regs[C[pc]])
+      elif code == ADD_IMM:
+        regs[a] = wrap(regs[B_[pc]] + C[pc])
+      elif code == SUB_IMM:
+        regs[a] = wrap(regs[B_[pc]] - C[pc])
+      elif code == CMP_REG:
+        left, right = regs[a], regs[B_[pc]]
+      elif code == CMP_IMM:
+        left, right = regs[a], B_[pc]
+      elif code == CSET:
+        regs[a] = int(condition(B_[pc], left, right))
+      elif code == B:
+        pc = a
+        continue
+      elif code == B_COND:
+        if condition(B_[pc], left, right):
+          pc = a
+          continue
+      elif code == BL:
+        regs[30] = pc + 1
+        pc = a
+        continue
+      elif code == RET:
+        pc = regs[30]
+        continue
+      elif code == STP:
+        address = regs[B_[pc]] + C[pc] - base
+        if address < 0:
+          raise struct.error
+        pack('<qq', memory, address, regs[a & 0xff], regs[a >> 8])
+      elif code == LDP:
+        address = regs[B_[pc]] + C[pc] - base
+        if address < 0:
+          raise struct.error
+        regs[a & 0xff], regs[a >> 8] = unpack('<qq', memory, address)
+      elif code == MOVZ or code == MOVN:
+        regs[a] = B_[pc]
+      elif code == MOVK:
+        regs[a] = wrap(regs[a] & ~(0xffff << C[pc]) | B_[pc] << C[pc])
+      elif code == ADD_LSL:
+        regs[a] = wrap(regs[B_[pc]] + (regs[C[pc] & 0xff] << (C[pc] >> 8)))
+      elif code == NEG:
+        regs[a] = wrap(-regs[B_[pc]])
+      elif code == MUL:
+        regs[a] = wrap(regs[B_[pc]] * regs[C[pc]])
+      elif code == UMULH:
+        regs[a] = wrap((regs[B_[pc]] & MASK) * (regs[C[pc]] & MASK) >> 64)
+      elif code == SDIV:
+        regs[a] = truncating_divide(regs[B_[pc]], regs[C[pc]])
+      elif code == MSUB:
+        regs[a] = wrap(regs[C[pc] >> 8] - regs[B_[pc]] * regs[C[pc] & 0xff])
+      elif code == LSL_IMM:
+        regs[a] = wrap(regs[B_[pc]] << C[pc])
+      elif code == LSL_REG:
+        regs[a] = wrap(regs[B_[pc]] << (regs[C[pc]] & 63))
+      elif code == LSR_IMM:
+        regs[a] = wrap((regs[B_[pc]] & MASK) >> C[pc])
+      elif code == LSR_REG:
+        regs[a] = wrap((regs[B_[pc]] & MASK) >> (regs[C[pc]] & 63))
+      elif code == ASR_IMM:
+        regs[a] = regs[B_[pc]] >> C[pc]
+      elif code == ASR_REG:
+        regs[a] = regs[B_[pc]] >> (regs[C[pc]] & 63)
+      elif code == AND_IMM:
+        regs[a] = wrap(regs[B_[pc]] & C[pc])
+      elif code == AND_REG:
+        regs[a] = regs[B_[pc]] & regs[C[pc]]
+      elif code == EOR_REG:
+        regs[a] = regs[B_[pc]] ^ regs[C[pc]]
+      regs[XZR] = 0
+      pc += 1
+  except struct.error:
+    raise SimError(f"Memory access outside the stack at line {program.instrs[pc].line}")
+
+  return regs[0], counts
+
+def condition(cond, left, right):
+  if cond == 0:
+    return left == right
+  elif cond == 1:
+    return left != right
+  elif cond == 2:
+    return left < right
+  elif cond == 3:
+    return left > right
+  elif cond == 4:
+    return left <= right
+  else:
+    return left >= right
+
+def report(program, counts):
+  by_opcode = {}
+  by_function = {}
+  loads = stores = read_bytes = written_bytes = 0
+  for i, count in enumerate(counts):
+    if not count:
+      continue
+    code = program.op[i]
+    name = OPCODE_NAMES[code]
+    by_opcode[name] = by_opcode.get(name, 0) + count
+    function = program.function_of(i)
+    by_function[function] = by_function.get(function, 0) + count
+    if code in LOADS:
+      loads += count
+      read_bytes += count * LOADS[code]
+    if code in STORES:
+      stores += count
+      written_bytes += count * STORES[code]
+  return {
+    'instructions': sum(by_opcode.values()),
+    'by_opcode': dict(sorted(by_opcode.items(), key=lambda kv: -kv[1])),
+    'by_function': dict(sorted(by_function.items(), key=lambda kv: -kv[1])),
+    'loads': loads,
+    'stores': stores,
+    'bytes_read': read_bytes,
+    'bytes_written': written_bytes,
+    # every instruction waits out its full latency, loads at l1 hit latency
+    'cycles': sum(COSTS[name].latency * count for name, count in by_opcode.items()),
+  }
+
+def simulate(text, argc=1):
+  program = Program(text)
+  exit_value, counts = run(program, argc)
+  result = report(program, counts)
+  result['exit_value'] = exit_value
+  return result
+
+def print_report(result):
+  print(f"exit value    {result['exit_value']} (status {result['exit_value'] & 0xff})")
+  print(f"instructions  {result['instructions']}")
+  print(f"cycles        ~{result['cycles']}")
+  print(f"memory        {result['loads']} loads ({result['bytes_read']} bytes), {result['stores']} stores ({result['bytes_written']} bytes)")
+  print("by opcode")
+  for name, count in result['by_opcode'].items():
+    print(f"  {name:<8} {count}")
+  print("by function")
+  for name, count in result['by_function'].items():
+    print(f"  {name:<20} {count}")
+
+def main():
+  if len(sys.argv) not in (2, 3):
+    print("Usage: python sim.py <file.S> [argc]")
+    sys.exit(1)
+  with open(sys.argv[1]) as f:
+    text = f.read()
+  argc = int(sys.argv[2]) if len(sys.argv) == 3 else 1
+  try:
+    print_report(simulate(text, argc))
+  except SimError as e:
+    print(f"Error: {e}")
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
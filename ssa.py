@@ -1,4 +1,5 @@
 from tree import Tree
+from hashcons import intern_expr
 
 def ssa(block_tree):
   funcs = []
@@ -14,7 +15,7 @@ def ssa_func(func):
 
   for block in func.block:
     variables = param_vars  # variables is a mapping from variable name to the latest version of that variable
-    for stmt in block.stmts:
+    for stmt in func.block.stmts(block):
       print(stmt)
       if stmt.type == 'assign':
         stmt.expr = ssa_expr(stmt.expr, variables)
@@ -32,16 +33,16 @@ def ssa_func(func):
 
 def ssa_expr(expr, variables):
   # we want to replace any instances of a variable with the latest version of that variable
+  # expressions are shared between statements, so this builds new ones instead of renaming in place
   if isinstance(expr, Tree):
     if expr.type == 'binop':
-      expr.left = ssa_expr(expr.left, variables)
-      expr.right = ssa_expr(expr.right, variables)
-      return expr
+      return intern_expr('binop', left=ssa_expr(expr.left, variables), op=expr.op, right=ssa_expr(expr.right, variables))
     elif expr.type == 'variable':
-      expr.name = variables[expr.name]
-      return expr
+      return intern_expr('variable', name=variables[expr.name])
     elif expr.type == 'int':
       return expr
+    elif expr.type == 'call':
+      return intern_expr('call', name=expr.name, args=[ssa_expr(arg, variables) for arg in expr.args])
     else:
       raise Exception(f"Unknown expr type: {expr.type}")
   raise Exception(f"ssa for expr not implemented: {expr}")
@@ -15,7 +15,7 @@ class Tree:
     def dump_(v):
       if isinstance(v, Tree):
         return v.dump(indent + 1)
-      elif isinstance(v, list):
+      elif isinstance(v, (list, tuple)):
         def listindented(s):
           assert isinstance(s, str)
           lines = s.split('\n')
@@ -29,7 +29,8 @@ class Tree:
     return {k: v.dictdump() if isinstance(v, Tree) else v for k, v in self.__dict__.items() if k != 'type'}
 
   def __getattribute__(self, key):
-    if key in ('__dict__', 'dump', 'type', '__repr__', '__getattribute__', 'dictdump'):
+    # dunders go to the normal lookup, so copy, pickle and isinstance see AttributeError for the ones a Tree doesn't have
+    if key in ('dump', 'type', 'dictdump') or (key.startswith('__') and key.endswith('__')):
       return super().__getattribute__(key)
     if key not in self.__dict__:
       print(f"Warning: key '{key}' not in {self}")
@@ -0,0 +1,307 @@
+from tree import Tree
+from hashcons import Expr, intern_expr
+from int64 import wrap
+
+# whole program mode: merge the functions of every input file, then starting from main
+# - fold calls to pure functions whose arguments are all constants by running them at compile time
+# - specialize callees for the constant arguments of a call site, by cloning them
+# - drop every function that main can no longer reach
+
+FUEL = 10000  # statements we are willing to interpret to fold a single call
+MAX_CLONES = 8  # specializations per function, so f(n) calling f(n + 1) doesn't clone forever
+
+def floor_divide(a, b):
+  if b == 0:
+    raise GiveUp("division by zero")
+  return a // b
+
+def floor_modulo(a, b):
+  if b == 0:
+    raise GiveUp("division by zero")
+  return a % b
+
+# what the generated code computes, before wrapping to 64 bits: // and % round towards negative infinity like python,
+# and shift amounts are taken mod 64 like the hardware does
+FOLDABLE_OPS = {
+  '+': lambda a, b: a + b,
+  '-': lambda a, b: a - b,
+  '*': lambda a, b: a * b,
+  '//': floor_divide,
+  '%': floor_modulo,
+  '<<': lambda a, b: a << (b & 63),
+  '>>': lambda a, b: a >> (b & 63),
+  '==': lambda a, b: int(a == b),
+  '!=': lambda a, b: int(a != b),
+  '<': lambda a, b: int(a < b),
+  '>': lambda a, b: int(a > b),
+  '<=': lambda a, b: int(a <= b),
+  '>=': lambda a, b: int(a >= b),
+}
+
+funcs = None  # name -> def, including clones
+pure = None  # names of functions that only call other pure functions
+clones = None  # (name, constants) -> name of the clone
+clone_of = None  # clone name -> original name
+fuel = 0
+
+class GiveUp(Exception):
+  """the call can't be evaluated at compile time, or isn't worth it"""
+
+def whole_program(files):
+  global funcs, pure, clones, clone_of
+  funcs = {}
+  for file in files:
+    for func in file.funcs:
+      assert func.name not in funcs, f"Function {func.name} is defined more than once"
+      funcs[func.name] = func
+  assert 'main' in funcs, "Whole program mode needs a main function"
+
+  pure = find_pure_functions()
+  clones = {}
+  clone_of = {}
+
+  optimized = {}
+  worklist = ['main']
+  while worklist:
+    name = worklist.pop()
+    if name in optimized or name not in funcs:
+      continue
+    func = funcs[name]
+    optimized[name] = rebuild(func, stmts=[optimize_stmt(stmt) for stmt in func.stmts])
+    worklist.extend(called_names(optimized[name].stmts))
+
+  # keep the source order, with each clone right after the function it came from
+  ordered = []
+  for name in funcs:
+    if name in clone_of:
+      continue
+    ordered.extend(optimized[n] for n in [name] + [c for c, o in clone_of.items() if o == name] if n in optimized)
+  return Tree(type='file', filename=files[0].filename, funcs=ordered)
+
+def rebuild(node, **changes):
+  """copy of node with some fields replaced. trees coming out of the parser are never mutated here"""
+  fields = dict(node.__dict__)
+  fields.update(changes)
+  if isinstance(node, Expr):
+    return intern_expr(**fields)
+  return Tree(**fields)
+
+def constant(value):
+  return intern_expr('int', value=value)
+
+# === call graph ===
+
+def called_names(stmts):
+  names = []
+  def visit(node):
+    if isinstance(node, Tree):
+      if node.type == 'call':
+        names.append(node.name)
+      for k, v in node.__dict__.items():
+        if k != 'type':
+          visit(v)
+    elif isinstance(node, (list, tuple)):
+      for x in node:
+        visit(x)
+  for stmt in stmts:
+    visit(stmt)
+  return names
+
+def find_pure_functions():
+  """functions that don't call anything outside the program, directly or transitively"""
+  calls = {name: set(called_names(func.stmts)) for name, func in funcs.items()}
+  impure = {name for name, callees in calls.items() if any(callee not in funcs for callee in callees)}
+  changed = True
+  while changed:
+    changed = False
+    for name, callees in calls.items():
+      if name not in impure and callees & impure:
+        impure.add(name)
+        changed = True
+  return set(funcs) - impure
+
+def assigned_names(stmts):
+  names = set()
+  for stmt in stmts:
+    if stmt.type == 'assign':
+      names.add(stmt.var)
+    elif stmt.type in ('if', 'while'):
+      names |= assigned_names(stmt.block)
+    elif stmt.type == 'ifelse':
+      names |= assigned_names(stmt.if_block) | assigned_names(stmt.else_block)
+  return names
+
+# === rewriting ===
+
+def optimize_stmt(stmt):
+  if stmt.type == 'assign':
+    return rebuild(stmt, expr=optimize_expr(stmt.expr))
+  elif stmt.type == 'return':
+    return rebuild(stmt, expr=optimize_expr(stmt.expr))
+  elif stmt.type in ('if', 'while'):
+    return rebuild(stmt, condition=optimize_expr(stmt.condition), block=[optimize_stmt(s) for s in stmt.block])
+  elif stmt.type == 'ifelse':
+    return rebuild(stmt, condition=optimize_expr(stmt.condition),
+                   if_block=[optimize_stmt(s) for s in stmt.if_block],
+                   else_block=[optimize_stmt(s) for s in stmt.else_block])
+  else:
+    raise Exception(f"Unknown stmt type: {stmt.type}")
+
+def optimize_expr(expr):
+  if expr.type in ('int', 'variable'):
+    return expr
+  elif expr.type == 'binop':
+    left, right = optimize_expr(expr.left), optimize_expr(expr.right)
+    if left.type == 'int' and right.type == 'int' and expr.op in FOLDABLE_OPS:
+      try:
+        return constant(wrap(FOLDABLE_OPS[expr.op](left.value, right.value)))
+      except GiveUp:
+        pass
+    return rebuild(expr, left=left, right=right)
+  elif expr.type == 'call':
+    args = [optimize_expr(arg) for arg in expr.args]
+    if expr.name not in funcs or not any(arg.type == 'int' for arg in args):
+      return rebuild(expr, args=args)
+    if expr.name in pure and all(arg.type == 'int' for arg in args):
+      try:
+        return constant(evaluate_call(expr.name, [arg.value for arg in args]))
+      except GiveUp:
+        pass
+    return specialize(expr, args)
+  else:
+    raise Exception(f"Unknown expr type: {expr.type}")
+
+def specialize(call, args):
+  constants = tuple(arg.value if arg.type == 'int' else None for arg in args)
+  key = (call.name, constants)
+  if key not in clones:
+    callee = funcs[call.name]
+    origin = clone_of.get(call.name, call.name)
+    if call.name == 'main' or len(callee.params) != len(args) or sum(o == origin for o in clone_of.values()) >= MAX_CLONES:
+      return rebuild(call, args=args)
+    if not any(c is not None and p in read_names(callee.stmts) for p, c in zip(callee.params, constants)):
+      return rebuild(call, args=args)  # the constants aren't used for anything, a clone wouldn't buy anything
+    clones[key] = make_clone(callee, constants, origin)
+  return rebuild(call, name=clones[key], args=[arg for arg, c in zip(args, constants) if c is None])
+
+def make_clone(callee, constants, origin):
+  suffix = "_".join('x' if c is None else str(c).replace('-', 'm') for c in constants)
+  name = f"{callee.name}__{suffix}"
+  bound = {p: c for p, c in zip(callee.params, constants) if c is not None}
+
+  # a param that the body never writes can be replaced by its value.  otherwise it becomes a local initialized to it
+  assigned = assigned_names(callee.stmts)
+  prefix = [Tree(type='assign', var=p, expr=constant(c)) for p, c in bound.items() if p in assigned]
+  substitution = {p: c for p, c in bound.items() if p not in assigned}
+
+  clone = rebuild(callee, name=name,
+                  params=[p for p, c in zip(callee.params, constants) if c is None],
+                  stmts=prefix + [substitute_stmt(stmt, substitution) for stmt in callee.stmts])
+  funcs[name] = clone
+  clone_of[name] = origin
+  if callee.name in pure:
+    pure.add(name)
+  return name
+
+def read_names(stmts):
+  names = set()
+  def visit(node):
+    if isinstance(node, Tree):
+      if node.type == 'variable':
+        names.add(node.name)
+      for k, v in node.__dict__.items():
+        if k != 'type':
+          visit(v)
+    elif isinstance(node, (list, tuple)):
+      for x in node:
+        visit(x)
+  visit(stmts)
+  return names
+
+def substitute_stmt(stmt, substitution):
+  if stmt.type in ('assign', 'return'):
+    return rebuild(stmt, expr=substitute_expr(stmt.expr, substitution))
+  elif stmt.type in ('if', 'while'):
+    return rebuild(stmt, condition=substitute_expr(stmt.condition, substitution),
+                   block=[substitute_stmt(s, substitution) for s in stmt.block])
+  elif stmt.type == 'ifelse':
+    return rebuild(stmt, condition=substitute_expr(stmt.condition, substitution),
+                   if_block=[substitute_stmt(s, substitution) for s in stmt.if_block],
+                   else_block=[substitute_stmt(s, substitution) for s in stmt.else_block])
+  else:
+    raise Exception(f"Unknown stmt type: {stmt.type}")
+
+def substitute_expr(expr, substitution):
+  if expr.type == 'variable' and expr.name in substitution:
+    return constant(substitution[expr.name])
+  elif expr.type == 'binop':
+    return rebuild(expr, left=substitute_expr(expr.left, substitution), right=substitute_expr(expr.right, substitution))
+  elif expr.type == 'call':
+    return rebuild(expr, args=[substitute_expr(arg, substitution) for arg in expr.args])
+  return expr
+
+# === compile time evaluation ===
+
+def evaluate_call(name, args):
+  global fuel
+  fuel = FUEL
+  try:
+    return call_function(name, args)
+  except RecursionError:
+    raise GiveUp(f"{name} recurses too deeply")
+
+def call_function(name, args):
+  func = funcs[name]
+  if len(func.params) != len(args):
+    raise GiveUp(f"{name} called with {len(args)} arguments, takes {len(func.params)}")
+  result = run_block(func.stmts, dict(zip(func.params, args)))
+  if result is None:
+    raise GiveUp(f"{name} can finish without returning")
+  return result
+
+def run_block(stmts, env):
+  """returns the value of the return statement that was hit, or None if the block ran to its end"""
+  global fuel
+  for stmt in stmts:
+    fuel -= 1
+    if fuel < 0:
+      raise GiveUp("out of fuel")
+
+    result = None
+    if stmt.type == 'assign':
+      env[stmt.var] = eval_expr(stmt.expr, env)
+    elif stmt.type == 'return':
+      return eval_expr(stmt.expr, env)
+    elif stmt.type == 'if':
+      if eval_expr(stmt.condition, env):
+        result = run_block(stmt.block, env)
+    elif stmt.type == 'ifelse':
+      result = run_block(stmt.if_block if eval_expr(stmt.condition, env) else stmt.else_block, env)
+    elif stmt.type == 'while':
+      while result is None and eval_expr(stmt.condition, env):
+        fuel -= 1
+        if fuel < 0:
+          raise GiveUp("out of fuel")
+        result = run_block(stmt.block, env)
+    else:
+      raise GiveUp(f"Unknown stmt type: {stmt.type}")
+    if result is not None:
+      return result
+  return None
+
+def eval_expr(expr, env):
+  if expr.type == 'int':
+    return expr.value
+  elif expr.type == 'variable':
+    if expr.name not in env:
+      raise GiveUp(f"{expr.name} read before it is written")
+    return env[expr.name]
+  elif expr.type == 'binop':
+    if expr.op not in FOLDABLE_OPS:
+      raise GiveUp(f"can't fold {expr.op}")
+    return wrap(FOLDABLE_OPS[expr.op](eval_expr(expr.left, env), eval_expr(expr.right, env)))
+  elif expr.type == 'call':
+    if expr.name not in pure:
+      raise GiveUp(f"{expr.name} is not pure")
+    return call_function(expr.name, [eval_expr(arg, env) for arg in expr.args])
+  raise GiveUp(f"Unknown expr type: {expr.type}")